@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Throughput of the predicates compiled by prismic.filters, over synthetic documents.
+
+Compares a compiled filter with :func:`prismic.filters.matches`, which resolves the predicates for each
+document. Run with ``python benchmarks/bench_filters.py [number of documents]``.
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from prismic import filters, predicates  # noqa: E402
+
+PREDICATES = [
+    ("at document.type", [predicates.at("document.type", "product")]),
+    ("any document.tags", [predicates.any("document.tags", ["tag3", "tag7"])]),
+    ("in document.id", [predicates.in_("document.id", ["doc%d" % i for i in range(0, 10000, 7)])]),
+    ("number.inRange", [predicates.in_range("my.product.price", 10, 20)]),
+    ("date.after", [predicates.date_after("my.product.release", "2016-06-01")]),
+    ("date.month", [predicates.month("my.product.release", "june")]),
+    ("fulltext", [predicates.fulltext("my.product.name", "speculoos")]),
+    ("geopoint.near", [predicates.near("my.product.shop", 48.86, 2.35, 50)]),
+    ("type + price + tags", [predicates.at("document.type", "product"), predicates.lt("my.product.price", 30),
+                             predicates.at("document.tags", "tag1")]),
+]
+
+
+def make_documents(count):
+    random.seed(42)
+    words = ["speculoos", "macaron", "chocolate", "vanilla", "tart", "cupcake", "pie", "onion"]
+    documents = []
+    for i in range(count):
+        documents.append({
+            "id": "doc%d" % i,
+            "uid": "uid%d" % i,
+            "type": "product" if i % 4 else "author",
+            "tags": ["tag%d" % random.randint(0, 9) for _ in range(2)],
+            "data": {"product": {
+                "name": {"type": "StructuredText", "value": [
+                    {"type": "paragraph", "text": " ".join(random.sample(words, 3)), "spans": []}
+                ]},
+                "price": {"type": "Number", "value": random.uniform(1, 50)},
+                "release": {"type": "Date", "value": "2016-%02d-%02d" % (random.randint(1, 12), random.randint(1, 28))},
+                "shop": {"type": "GeoPoint", "value": {"latitude": random.uniform(43, 51),
+                                                       "longitude": random.uniform(-2, 7)}}
+            }}
+        })
+    return documents
+
+
+def main(count):
+    documents = make_documents(count)
+    print("%-22s %14s %14s %8s" % ("predicates", "compiled/s", "matches/s", "matched"))
+    for name, q in PREDICATES:
+        test = filters.compile(*q)
+        compiled = min(timeit.repeat(lambda: [d for d in documents if test(d)], number=1, repeat=3))
+        interpreted = min(timeit.repeat(lambda: [d for d in documents if filters.matches(d, *q)], number=1,
+                                        repeat=3))
+        matched = len([d for d in documents if test(d)])
+        print("%-22s %14d %14d %8d" % (name, count / compiled, count / interpreted, matched))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.aio
+~~~~~~~~~~~
+
+This module implements an asyncio version of the Prismic API (Python 3.5+).
+
+The default request handler is based on aiohttp, which must be installed separately
+(``pip install prismic[aio]``).
+
+"""
+
+import asyncio
+import logging
+import platform
+import time
+from collections import OrderedDict
+from copy import copy
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from . import __version__ as prismic_version
+from . import predicates
+from .api import BaseApi, BaseSearchForm, Response, IdsResponse, counts, API_DEFAULT_TTL
+from .connection import (build_url, get_default_cache, parse_response, _is_entry, _is_fresh,
+                         _can_serve_stale, _can_serve_on_error, _conditional_headers, _cache_entry)
+from .exceptions import HTTPError, DeadlineExceededError
+from .links import collect_links, attach_documents, GraphWalk
+from .loader import url_safe_chunks
+from .utils import AsyncSingleFlight, accepts_argument, is_retryable
+
+log = logging.getLogger(__name__)
+
+NETWORK_ERRORS = (IOError, asyncio.TimeoutError) + ((aiohttp.ClientError,) if aiohttp is not None else ())
+
+
+class AiohttpRequestHandler(object):
+    """
+    An asynchronous request handler based on a pooled :class:`aiohttp.ClientSession`.
+
+    A session is bound to an event loop, so one is created lazily for each loop the handler is used in.
+
+    :param limit_per_host: maximum number of connections to keep open per host.
+    :param timeout: timeout in seconds for each request (optional).
+    """
+
+    def __init__(self, limit_per_host=10, timeout=None):
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self._sessions = {}
+
+    async def __call__(self, full_url, headers=None):
+        request_headers = {
+            "Accept": "application/json",
+            "User-Agent": "Prismic-python-kit/%s Python/%s" % (
+                prismic_version,
+                platform.python_version()
+            )
+        }
+        if headers:
+            request_headers.update(headers)
+        async with self.session.get(full_url, headers=request_headers) as response:
+            return response.status, await response.text(), response.headers
+
+    @property
+    def session(self):
+        """The :class:`aiohttp.ClientSession` of the running event loop"""
+        if aiohttp is None:
+            raise ImportError("The asyncio request handler requires aiohttp: pip install aiohttp")
+        loop = asyncio.get_event_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            # Forget the sessions of the loops that were closed in the meantime
+            self._sessions = {l: s for (l, s) in self._sessions.items() if not l.is_closed()}
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            connector = aiohttp.TCPConnector(limit_per_host=self.limit_per_host)
+            session = self._sessions[loop] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return session
+
+    async def close(self):
+        """Closes the session of the running event loop"""
+        session = self._sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+default_request_handler = AiohttpRequestHandler()
+
+
+class AsyncCache(object):
+    """
+    Adapts a synchronous cache, such as :class:`MemoryCache <prismic.cache.MemoryCache>`, to the asynchronous
+    cache protocol: ``await cache.get(key)`` and ``await cache.set(key, val, ttl)``.
+
+    Any object implementing these coroutines (duck typing) is acceptable as an asynchronous cache backend.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    async def get(self, key):
+        return self.cache.get(key)
+
+    async def set(self, key, val, ttl=0):
+        self.cache.set(key, val, ttl)
+
+    def __getattr__(self, name):
+        # is_immutable, retain_refs, immutable_ttl... of the wrapped cache
+        return getattr(self.cache, name)
+
+
+def as_async_cache(cache):
+    """Returns the given cache if it implements the asynchronous cache protocol, or wraps it in an
+    :class:`AsyncCache`."""
+    if asyncio.iscoroutinefunction(getattr(cache, "get", None)):
+        return cache
+    return AsyncCache(cache)
+
+
+# Concurrent requests for the same URL are coalesced into a single fetch
+inflight_requests = AsyncSingleFlight()
+
+# Background refreshes in progress, by URL. Holding the tasks prevents them from being garbage collected
+_revalidating = {}
+
+
+async def get(url, access_token=None, cache=None, request_handler=None, max_stale=0):
+    """Fetches the prismic api JSON.
+    Returns :class:`AsyncApi <AsyncApi>` object.
+
+    :param url: URL to the api of the repository (mandatory).
+    :param access_token: The access token (optional).
+    :param cache: The cache object, synchronous or asynchronous. Optional, will default to the process-wide
+                  in-memory cache of the repository.
+    :param request_handler: The asynchronous request handler. Optional, will default to a request handler
+                            based on aiohttp.
+    :param max_stale: Number of seconds an expired cached response may still be served while it is refreshed in
+                      the background.
+    """
+    cache = as_async_cache(get_default_cache(url) if cache is None else cache)
+    return AsyncApi(
+        await get_json(url, access_token=access_token, cache=cache, request_handler=request_handler,
+                       max_stale=max_stale, default_ttl=API_DEFAULT_TTL),
+        access_token,
+        cache,
+        request_handler,
+        max_stale
+    )
+
+
+async def get_json(url, params=None, access_token=None, cache=None, ttl=None, request_handler=None, max_stale=0,
+                   default_ttl=None):
+    """The asynchronous version of :func:`prismic.connection.get_json`."""
+    cache = as_async_cache(get_default_cache(url) if cache is None else cache)
+    if request_handler is None:
+        request_handler = default_request_handler
+    full_url = build_url(url, params, access_token)
+
+    entry = await cache.get(full_url)
+    if not _is_entry(entry):
+        entry = None
+    now = time.time()
+    if _is_fresh(entry, now):
+        return entry["body"]
+
+    def fetch():
+        return _fetch_json(full_url, access_token, cache, ttl, request_handler, max_stale, entry, default_ttl)
+
+    if _can_serve_stale(entry, now, max_stale):
+        _revalidate_in_background(full_url, fetch)
+        return entry["body"]
+    try:
+        return await inflight_requests.do(full_url, fetch)
+    except NETWORK_ERRORS + (HTTPError,) as e:
+        if _can_serve_on_error(entry, now, e):
+            log.warning("Serving stale response for %s: %s", full_url, e)
+            return entry["body"]
+        raise
+
+
+def _revalidate_in_background(full_url, fetch):
+    if full_url in _revalidating:
+        return
+
+    async def revalidate():
+        try:
+            await inflight_requests.do(full_url, fetch)
+        except Exception as e:
+            log.warning("Background refresh of %s failed: %s", full_url, e)
+        finally:
+            _revalidating.pop(full_url, None)
+
+    _revalidating[full_url] = asyncio.ensure_future(revalidate())
+
+
+async def _fetch_json(full_url, access_token, cache, ttl, request_handler, max_stale=0, entry=None,
+                      default_ttl=None):
+    validators = _conditional_headers(entry)
+    if validators and accepts_argument(request_handler, "headers"):
+        status_code, text_result, headers = await request_handler(full_url, headers=validators)
+    else:
+        status_code, text_result, headers = await request_handler(full_url)
+    if status_code == 304 and validators:
+        body = entry["body"]
+        previous = entry
+    else:
+        body = parse_response(status_code, text_result, access_token)
+        previous = None
+    stored = _cache_entry(cache, full_url, body, headers, ttl, max_stale, previous, default_ttl)
+    if stored is not None:
+        await cache.set(full_url, *stored)
+    return body
+
+
+class AsyncApi(BaseApi):
+    """
+    The asynchronous version of :class:`Api <prismic.api.Api>`. Use ``await prismic.aio.get()`` to fetch one.
+
+    The methods doing requests are coroutines. The helpers of :class:`Api <prismic.api.Api>` built on threads or
+    iterators are not available.
+    """
+
+    def form(self, name):
+        """Constructs the form with data from Api.
+        Returns :class:`AsyncSearchForm <AsyncSearchForm>` object.
+
+        :param name: Name of the form.
+        """
+        return self._form(AsyncSearchForm, name)
+
+    async def preview_session(self, token, link_resolver, default_url):
+        main_document_id = (await get_json(token, request_handler=self.request_handler)).get("mainDocument")
+        if main_document_id is None:
+            return default_url
+        doc = await self.get_by_id(main_document_id, ref=token)
+        if doc is None:
+            return default_url
+        return link_resolver(doc.as_link())
+
+    async def query(self, q, ref=None, page_size=None, page=None, orderings=None, after=None, fetch_links=None):
+        return await self._query_form(q, ref, page_size, page, orderings, after, fetch_links).submit()
+
+    async def query_many(self, queries, timeout=None, max_concurrency=8):
+        """The asynchronous version of :meth:`Api.query_many <prismic.api.Api.query_many>`: runs several queries
+        concurrently, and returns their responses or exceptions in order.
+
+        :param max_concurrency: maximum number of queries running at the same time.
+        """
+        forms = [query if isinstance(query, BaseSearchForm) else self._query_form(**query) for query in queries]
+        return await AsyncSearchForm.submit_many(forms, timeout, max_concurrency)
+
+    async def count_many(self, queries, timeout=None, max_concurrency=8):
+        """The asynchronous version of :meth:`Api.count_many <prismic.api.Api.count_many>`: counts the results of
+        several queries concurrently, and returns the counts or exceptions in order.
+
+        :param max_concurrency: maximum number of counts running at the same time.
+        """
+        forms = [query if isinstance(query, BaseSearchForm) else self._query_form(**query) for query in queries]
+        return await AsyncSearchForm.count_many(forms, timeout, max_concurrency)
+
+    async def query_first(self, q, ref=None):
+        documents = (await self.query(q, ref, page_size=1, page=1)).documents
+        if len(documents) > 0:
+            return documents[0]
+
+    async def get_by_uid(self, type, uid, ref=None):
+        return await self.query_first(predicates.at('my.' + type + '.uid', uid), ref)
+
+    async def get_by_id(self, id, ref=None):
+        return await self.query_first(predicates.at('document.id', id), ref)
+
+    async def get_by_ids(self, ids, ref=None, page_size=None, page=None, orderings=None, after=None,
+                         fetch_links=None, max_concurrency=4):
+        """The asynchronous version of :meth:`Api.get_by_ids <prismic.api.Api.get_by_ids>`.
+
+        :param max_concurrency: maximum number of chunks fetched at the same time.
+        """
+        if page_size is not None or page is not None or orderings is not None or after is not None:
+            return await self.query(predicates.in_('document.id', ids), ref, page_size=page_size, page=page,
+                                    orderings=orderings, after=after, fetch_links=fetch_links)
+        unique_ids = list(OrderedDict.fromkeys(ids))
+        responses = await self.query_many([{
+            "q": predicates.in_('document.id', chunk),
+            "ref": ref,
+            "page_size": len(chunk),
+            "fetch_links": fetch_links
+        } for chunk in url_safe_chunks(unique_ids)], max_concurrency=max_concurrency)
+        documents = {}
+        for response in responses:
+            if isinstance(response, Exception):
+                raise response
+            for document in response.documents:
+                documents[document.id] = document
+        return IdsResponse(unique_ids, documents)
+
+    async def resolve_links(self, documents, ref=None, fetch_links=None):
+        """The asynchronous version of :meth:`Api.resolve_links <prismic.api.Api.resolve_links>`."""
+        documents = list(getattr(documents, "documents", documents))
+        links, ids = collect_links(documents)
+        linked = {}
+        if ids:
+            response = await self.get_by_ids(ids, ref, fetch_links=fetch_links)
+            linked = dict((document.id, document) for document in response.documents)
+        return attach_documents(documents, links, linked)
+
+    async def prefetch_links(self, documents, depth=2, max_documents=1000, ref=None, fetch_links=None):
+        """The asynchronous version of :meth:`Api.prefetch_links <prismic.api.Api.prefetch_links>`."""
+        walk = GraphWalk(documents, max_documents)
+        for _ in range(depth):
+            ids = walk.next_ids()
+            if not ids:
+                break
+            walk.add_level((await self.get_by_ids(ids, ref, fetch_links=fetch_links)).documents)
+        return walk.finish()
+
+    async def scan_page(self, q=None, ref=None, page_size=100, orderings=None, after=None, fetch_links=None):
+        """Fetches a page of a query, or of the whole ref if ``q`` is None, with keyset pagination: the
+        asynchronous counterpart of :meth:`Api.scan <prismic.api.Api.scan>`, one page per call::
+
+            documents, after = await api.scan_page(q)
+            while after is not None:
+                documents, after = await api.scan_page(q, after=after)
+
+        See :meth:`AsyncSearchForm.submit_after`.
+
+        :return: the documents of the page, and the ``after`` of the next page, or None after the last page
+        """
+        form = self._query_form(q, ref, None, None, orderings, None, fetch_links)
+        return await form.submit_after(after, page_size)
+
+    async def get_single(self, type, ref=None):
+        return await self.query_first(predicates.at('document.type', type), ref)
+
+    async def fetch_all(self, q, ref=None, page_size=100, orderings=None, fetch_links=None, concurrency=4, retries=2):
+        """Returns the documents of all the pages of a query. Once the first page gives the number of pages,
+        the other ones are fetched concurrently. Unlike :meth:`Api.query_all <prismic.api.Api.query_all>`, which
+        iterates over the pages, it returns all the documents at once.
+
+        :param concurrency: maximum number of pages fetched at the same time.
+        :param retries: number of times a failed page is retried.
+        :return: array<:class:`Document <prismic.api.Document>`>
+        """
+        form = self._query_form(q, ref, page_size, None, orderings, None, fetch_links)
+        return await form.submit_all(concurrency, retries)
+
+
+class AsyncSearchForm(BaseSearchForm):
+    """The asynchronous version of :class:`SearchForm <prismic.api.SearchForm>`.
+    """
+
+    async def submit(self):
+        """
+        Submit the query to the Prismic.io server
+
+        :return: :class:`Response <prismic.api.Response>`
+        """
+        return Response(await self.submit_json())
+
+    async def submit_json(self):
+        """
+        Submit the query to the Prismic.io server, without parsing the documents
+
+        :return: the JSON response, as a dict
+        """
+        self.submit_assert_preconditions()
+        return await get_json(
+            self.action,
+            self.data,
+            self.access_token,
+            self.cache,
+            request_handler=self.request_handler,
+            max_stale=self.max_stale
+        )
+
+    @staticmethod
+    async def submit_many(forms, timeout=None, max_concurrency=8):
+        """Submits several forms concurrently, at most ``max_concurrency`` at the same time, and returns their
+        responses or exceptions in order. A form whose submission did not complete before the timeout has a
+        :class:`DeadlineExceededError <prismic.exceptions.DeadlineExceededError>`.
+        """
+        return await _wait_all([form.submit for form in forms], timeout, max_concurrency)
+
+    @staticmethod
+    async def count_many(forms, timeout=None, max_concurrency=8):
+        """Counts the results of several forms concurrently, at most ``max_concurrency`` at the same time, and
+        returns the counts or exceptions in order."""
+        return await _wait_all([form.count for form in forms], timeout, max_concurrency)
+
+    async def submit_all(self, concurrency=4, retries=2):
+        """Returns the documents of all the pages of the query, starting from the current page. Once the first
+        page gives the number of pages, the other ones are fetched concurrently. The pages that fail because of a
+        network error, a server error or a timeout are retried on their own.
+
+        :param concurrency: maximum number of pages fetched at the same time.
+        :param retries: number of times a failed page is retried.
+        :return: array<:class:`Document <prismic.api.Document>`>
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_page(page):
+            for attempt in range(retries + 1):
+                try:
+                    async with semaphore:
+                        return await copy(self).page(page).submit()
+                except Exception as e:
+                    if attempt == retries or not (is_retryable(e) or isinstance(e, NETWORK_ERRORS)):
+                        raise
+
+        first_page = int(self.data.get("page") or 1)
+        first = await fetch_page(first_page)
+        pages = range(first_page + 1, (first.total_pages or 0) + 1)
+        others = await asyncio.gather(*[fetch_page(page) for page in pages])
+        documents = list(first.documents)
+        for response in others:
+            documents.extend(response.documents)
+        return documents
+
+    async def submit_after(self, after=None, page_size=100):
+        """Fetches the page of documents following the document ``after`` with keyset pagination, as each step
+        of :meth:`SearchForm.iter_after <prismic.api.SearchForm.iter_after>`.
+
+        :param after: id of the document to start after (optional). Defaults to the ``after`` of the form.
+        :param page_size: number of documents per request.
+        :return: array<:class:`Document <prismic.api.Document>`>, and the id to pass as ``after`` to fetch the
+                 next page, or None after the last page
+        """
+        form = copy(self).page(1).page_size(page_size)
+        after = after or self.data.get("after")
+        if after is not None:
+            form.after(after)
+        response = await form.submit()
+        if not response.documents or not response.next_page:
+            return response.documents, None
+        return response.documents, response.documents[-1].id
+
+    async def count(self):
+        """Count the total number of results, memoized for the queries on the master ref like
+        :meth:`SearchForm.count <prismic.api.SearchForm.count>`.
+        """
+        key = self.count_key()
+        count = counts.get(key) if key is not None else None
+        if count is None:
+            count = (await self.count_form().submit_json())["total_results_size"]
+            if key is not None:
+                counts.set(key, count, 0)
+        return count
+
+
+async def _wait_all(coroutine_functions, timeout=None, max_concurrency=None):
+    """Runs coroutine functions concurrently, at most ``max_concurrency`` at the same time, and returns their
+    results or exceptions in order. A call which did not complete before the timeout has a
+    :class:`DeadlineExceededError <prismic.exceptions.DeadlineExceededError>`.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def run(coroutine_function):
+        if semaphore is None:
+            return await coroutine_function()
+        async with semaphore:
+            return await coroutine_function()
+
+    tasks = [asyncio.ensure_future(run(coroutine_function)) for coroutine_function in coroutine_functions]
+    if not tasks:
+        return []
+    await asyncio.wait(tasks, timeout=timeout)
+    results = []
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+            results.append(DeadlineExceededError())
+        elif task.exception() is not None:
+            results.append(task.exception())
+        else:
+            results.append(task.result())
+    return results
@@ -11,51 +11,80 @@ This module implements the Prismic API.
 from __future__ import (absolute_import, division, print_function, unicode_literals)
 
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy, deepcopy
-from .connection import get_json, urlparse
+from .cache import MemoryCache
+from .connection import build_url, get_json, get_default_cache, urlparse
 from .experiments import Experiments
 from . import predicates
 from .exceptions import RefMissing
 from .fragments import Fragment
+from .loader import DocumentLoader, url_safe_chunks
+from .export import Exporter
+from .links import resolve_links, prefetch_graph
+from .queryset import QuerySet
 from collections import OrderedDict
 
-from .utils import string_types
+from .utils import string_types, run_concurrently, is_retryable
 import logging
 
 log = logging.getLogger(__name__)
 
+# Number of seconds the api document is cached when the server sends no freshness information
+API_DEFAULT_TTL = 5
 
-def get(url, access_token=None, cache=None, request_handler=None):
+# Maximum number of memoized counts
+COUNT_CACHE_SIZE = 10000
+
+# Fields of a form which don't change its number of results
+COUNT_IGNORED_FIELDS = ("page", "pageSize", "orderings", "fetch", "fetchLinks")
+
+# The counts of queries on master refs, by normalized query
+counts = MemoryCache(max_entries=COUNT_CACHE_SIZE)
+
+
+def get(url, access_token=None, cache=None, request_handler=None, max_stale=0):
     """Fetches the prismic api JSON.
     Returns :class:`Api <Api>` object.
 
     :param url: URL to the api of the repository (mandatory).
     :param access_token: The access token (optional).
-    :param cache: The cache object. Optional, will default to a file-based cache if None is passed.
+    :param cache: The cache object. Optional, will default to a process-wide in-memory cache shared by all the
+                  :class:`Api <Api>` objects of the same repository if None is passed.
     :param request_handler: The request handler. Optional, will default to a request handler based on requests module.
+    :param max_stale: Number of seconds an expired cached response may still be served while it is refreshed in
+                      the background. Optional, expired responses are never served by default.
     """
+    if cache is None:
+        cache = get_default_cache(url)
     return Api(
-        get_json(url, access_token=access_token, cache=cache, ttl=5, request_handler=request_handler),
+        get_json(url, access_token=access_token, cache=cache, request_handler=request_handler,
+                 max_stale=max_stale, default_ttl=API_DEFAULT_TTL),
         access_token,
         cache,
-        request_handler
+        request_handler,
+        max_stale
     )
 
 
-class Api(object):
+class BaseApi(object):
     """
-    A Prismic API, pointing to a specific repository. Use prismic.api.get() to fetch one.
+    The parts of a Prismic API that don't do any request, shared by :class:`Api <Api>` and
+    :class:`AsyncApi <prismic.aio.AsyncApi>`.
 
     :ivar dict bookmarks: all bookmarks, as a dict from name to document id
     :ivar array<str> types: all available types
     :ivar array<str> tags: all available tags
     :ivar Experiments experiments: information about current experiments
     :ivar str access_token: current access token (may be None)
+    :ivar int max_stale: number of seconds an expired cached response may still be served
     """
 
-    def __init__(self, data, access_token, cache, request_handler):
+    def __init__(self, data, access_token, cache, request_handler, max_stale=0):
         self.cache = cache
         self.request_handler = request_handler
+        self.max_stale = max_stale
         self.refs = [Ref(ref) for ref in data.get("refs")]
         self.bookmarks = data.get("bookmarks")
         self.types = data.get("types")
@@ -75,23 +104,8 @@ class Api(object):
         if not self.master:
             log.error("No master reference found")
 
-    def preview_session(self, token, link_resolver, default_url):
-        """Return the URL to display a given preview
-
-        :param token as received from Prismic server to identify the content to preview
-        :param link_resolver the link resolver to build URL for your site
-        :param default_url the URL to default to return if the preview doesn't correspond to a document
-                       (usually the home page of your site)
-
-        :return: the URL to redirect the user to
-        """
-        main_document_id = get_json(token, request_handler=self.request_handler).get("mainDocument")
-        if main_document_id is None:
-            return default_url
-        doc = self.get_by_id(main_document_id, ref=token)
-        if doc is None == 0:
-            return default_url
-        return link_resolver(doc.as_link())
+        if hasattr(cache, "retain_refs"):
+            cache.retain_refs([ref.ref for ref in self.refs])
 
     def get_ref(self, label):
         """Get the :class:`Ref <Ref>` with a specific label.
@@ -106,18 +120,14 @@ class Api(object):
         """Returns current master :class:`Ref <Ref>` object."""
         return self.master
 
-    def form(self, name):
-        """Constructs the form with data from Api.
-        Returns :class:`SearchForm <SearchForm>` object.
-
-        :param name: Name of the form.
-        """
+    def _form(self, form_class, name):
         form = self.forms.get(name)
         if form is None:
             raise Exception("Bad form name %s, valid form names are: %s" % (name, ', '.join(self.forms)))
-        return SearchForm(self.forms.get(name), self.access_token, self.cache, self.request_handler)
+        return form_class(form, self.access_token, self.cache, self.request_handler, self.max_stale,
+                          [ref.ref for ref in self.refs if ref.is_master_ref])
 
-    def query(self, q, ref=None, page_size=None, page=None, orderings=None, after=None, fetch_links=None):
+    def _query_form(self, q, ref=None, page_size=None, page=None, orderings=None, after=None, fetch_links=None):
         if ref is None:
             ref = self.get_master()
         form = self.form('everything').ref(ref)
@@ -131,7 +141,99 @@ class Api(object):
             form.after(after)
         if fetch_links is not None:
             form.fetch_links(fetch_links)
-        return form.query(q).submit()
+        if q is None:
+            return form
+        if q and not isinstance(q, string_types) and not isinstance(q[0], string_types):
+            return form.query(*q)  # A list of predicates
+        return form.query(q)
+
+
+class Api(BaseApi):
+    """
+    A Prismic API, pointing to a specific repository. Use prismic.api.get() to fetch one.
+    """
+
+    def preview_session(self, token, link_resolver, default_url):
+        """Return the URL to display a given preview
+
+        :param token as received from Prismic server to identify the content to preview
+        :param link_resolver the link resolver to build URL for your site
+        :param default_url the URL to default to return if the preview doesn't correspond to a document
+                       (usually the home page of your site)
+
+        :return: the URL to redirect the user to
+        """
+        main_document_id = get_json(token, request_handler=self.request_handler).get("mainDocument")
+        if main_document_id is None:
+            return default_url
+        doc = self.get_by_id(main_document_id, ref=token)
+        if doc is None == 0:
+            return default_url
+        return link_resolver(doc.as_link())
+
+    def form(self, name):
+        """Constructs the form with data from Api.
+        Returns :class:`SearchForm <SearchForm>` object.
+
+        :param name: Name of the form.
+        """
+        return self._form(SearchForm, name)
+
+    def query(self, q, ref=None, page_size=None, page=None, orderings=None, after=None, fetch_links=None):
+        return self._query_form(q, ref, page_size, page, orderings, after, fetch_links).submit()
+
+    def query_many(self, queries, max_workers=8, timeout=None):
+        """Runs several queries in parallel.
+
+        :param queries: the queries, each one being either a :class:`SearchForm <SearchForm>` or a dict of
+                        :meth:`query` arguments, for example ``{"q": predicates.at("document.type", "blog-post"),
+                        "page_size": 5}``.
+        :param max_workers: maximum number of queries running at the same time.
+        :param timeout: number of seconds after which all the queries must have completed (optional).
+        :return: array of :class:`Response <Response>`, in the same order as ``queries``. A query that failed has
+                 its exception instead, a query that did not complete before the timeout has a
+                 :class:`DeadlineExceededError <prismic.exceptions.DeadlineExceededError>`.
+        """
+        forms = [query if isinstance(query, SearchForm) else self._query_form(**query) for query in queries]
+        return SearchForm.submit_many(forms, max_workers, timeout)
+
+    def count_many(self, queries, max_workers=8, timeout=None):
+        """Counts the results of several queries in parallel, for example the facets of a listing.
+
+        :param queries: the queries, each one being either a :class:`SearchForm <SearchForm>` or a dict of
+                        :meth:`query` arguments.
+        :param max_workers: maximum number of counts running at the same time.
+        :param timeout: number of seconds after which all the counts must have completed (optional).
+        :return: array of int, in the same order as ``queries``, with the exception of a count that failed.
+        """
+        forms = [query if isinstance(query, SearchForm) else self._query_form(**query) for query in queries]
+        return SearchForm.count_many(forms, max_workers, timeout)
+
+    def query_all(self, q, ref=None, page_size=None, orderings=None, fetch_links=None, prefetch=1):
+        """Iterates over the documents of all the pages of a query, fetching the next pages in the background.
+        See :meth:`SearchForm.iter_documents <SearchForm.iter_documents>`.
+
+        :return: iterator<:class:`Document <Document>`>
+        """
+        form = self._query_form(q, ref, page_size, None, orderings, None, fetch_links)
+        return form.iter_documents(prefetch)
+
+    def scan(self, q=None, ref=None, page_size=100, orderings=None, after=None, fetch_links=None):
+        """Iterates over the documents of a query, or of the whole ref if ``q`` is None, with keyset pagination.
+        See :meth:`SearchForm.iter_after <SearchForm.iter_after>`.
+
+        :return: iterator<:class:`Document <Document>`>
+        """
+        form = self._query_form(q, ref, None, None, orderings, None, fetch_links)
+        return form.iter_after(after, page_size)
+
+    def query_set(self, *predicates):
+        """Returns a lazy :class:`QuerySet <prismic.queryset.QuerySet>` of the documents matching predicates,
+        which fetches only the documents that are used.
+
+        :param predicates: predicates built with :mod:`prismic.predicates <prismic.predicates>`.
+        """
+        return QuerySet(self, predicates)
 
     def query_first(self, q, ref=None):
         documents = self.query(q, ref, page_size=1, page=1).documents
@@ -144,20 +246,86 @@ class Api(object):
     def get_by_id(self, id, ref=None):
         return self.query_first(predicates.at('document.id', id), ref)
 
-    def get_by_ids(self, ids, ref=None, page_size=None, page=None, orderings=None, after=None, fetch_links=None):
-        return self.query(
-            predicates.in_('document.id', ids),
-            ref,
-            page_size=page_size,
-            page=page,
-            orderings=orderings,
-            after=after,
-            fetch_links=fetch_links
-        )
+    def get_by_ids(self, ids, ref=None, page_size=None, page=None, orderings=None, after=None, fetch_links=None,
+                   max_workers=4):
+        """Fetches documents by id.
+
+        Unless a page, page size, ordering or ``after`` is given, the ids are deduplicated and split into chunks
+        that fit in a URL and a page, which are fetched in parallel. The documents of the
+        :class:`IdsResponse <IdsResponse>` are then in the order of ``ids``. Otherwise, a single query is sent and
+        its :class:`Response <Response>` is returned.
+
+        :param ids: array of document ids.
+        :param max_workers: maximum number of chunks fetched at the same time.
+        """
+        if page_size is not None or page is not None or orderings is not None or after is not None:
+            return self.query(
+                predicates.in_('document.id', ids),
+                ref,
+                page_size=page_size,
+                page=page,
+                orderings=orderings,
+                after=after,
+                fetch_links=fetch_links
+            )
+        unique_ids = list(OrderedDict.fromkeys(ids))
+        chunks = url_safe_chunks(unique_ids)
+        responses = self.query_many([{
+            "q": predicates.in_('document.id', chunk),
+            "ref": ref,
+            "page_size": len(chunk),
+            "fetch_links": fetch_links
+        } for chunk in chunks], max_workers=max_workers)
+        documents = {}
+        for response in responses:
+            if isinstance(response, Exception):
+                raise response
+            for document in response.documents:
+                documents[document.id] = document
+        return IdsResponse(unique_ids, documents)
 
     def get_single(self, type, ref=None):
         return self.query_first(predicates.at('document.type', type), ref)
 
+    def loader(self, ref=None, batch_size=100, max_workers=4, fetch_links=None):
+        """Returns a :class:`DocumentLoader <prismic.loader.DocumentLoader>`, to batch the lookups of documents
+        by id or uid made while rendering a page.
+
+        :param ref: the ref to query. Defaults to the master ref.
+        :param batch_size: maximum number of ids or uids per query.
+        :param max_workers: maximum number of queries running at the same time.
+        :param fetch_links: the fetchLinks parameter of the queries (optional).
+        """
+        return DocumentLoader(self, ref, batch_size, max_workers, fetch_links)
+
+    def resolve_links(self, documents, ref=None, fetch_links=None, max_workers=4):
+        """Fetches the documents linked from a response, or from documents, in a few queries, and attaches them
+        to the links. See :func:`prismic.links.resolve_links <prismic.links.resolve_links>`.
+
+        :return: dict of the linked documents, by id
+        """
+        return resolve_links(self, documents, ref, fetch_links, max_workers)
+
+    def prefetch_links(self, documents, depth=2, max_documents=1000, ref=None, fetch_links=None, max_workers=4):
+        """Fetches the documents linked from a response, or from documents, and the ones they link to, up to
+        ``depth`` links away, one level at a time. See :func:`prismic.links.prefetch_graph
+        <prismic.links.prefetch_graph>`.
+
+        :return: OrderedDict of the given and fetched documents, by id
+        """
+        return prefetch_graph(self, documents, depth, max_documents, ref, fetch_links, max_workers)
+
+    def exporter(self, q=None, ref=None, page_size=100, fetch_links=None, format="jsonl", workers=4, retries=2):
+        """Returns an :class:`Exporter <prismic.export.Exporter>`, to dump the documents of a query, or of the
+        whole ref if ``q`` is None, to a file.
+
+        :param format: "jsonl" for JSON Lines, or "msgpack" for length-prefixed msgpack.
+        :param workers: maximum number of pages fetched at the same time.
+        :param retries: number of times a failed page is fetched again.
+        """
+        return Exporter(self, q, ref, page_size, fetch_links, format, workers, retries)
+
+
 class Ref(object):
     """
     A Prismic.io Reference (corresponds to a release)
@@ -171,11 +339,13 @@ class Ref(object):
         self.scheduled_at = data.get("scheduledAt")
 
 
-class SearchForm(object):
-    """Form to search for documents. Most of the methods return self object to allow chaining.
+class BaseSearchForm(object):
+    """The parts of a form that build the query without doing any request, shared by
+    :class:`SearchForm <SearchForm>` and :class:`AsyncSearchForm <prismic.aio.AsyncSearchForm>`. Most of the
+    methods return self object to allow chaining.
     """
 
-    def __init__(self, form, access_token, cache, request_handler):
+    def __init__(self, form, access_token, cache, request_handler, max_stale=0, master_refs=()):
         self.action = form.get("action")
         self.method = form.get("method")
         self.enctype = form.get("enctype")
@@ -188,6 +358,8 @@ class SearchForm(object):
         self.access_token = access_token
         self.cache = cache
         self.request_handler = request_handler
+        self.max_stale = max_stale
+        self.master_refs = frozenset(master_refs)
 
     def ref(self, ref):
         """:param ref: A :class:`Ref <Ref>` object or an string."""
@@ -207,7 +379,7 @@ class SearchForm(object):
         elif hasattr(field, '__iter__'):
             strings = []
             for item in field:
-                strings.append(SearchForm._serialize(item))
+                strings.append(BaseSearchForm._serialize(item))
             return "[" + ", ".join(strings) + "]"
         else:
             return str(field)
@@ -227,7 +399,7 @@ class SearchForm(object):
                 op = predicate[0]
                 args = []
                 for arg in predicate[1:]:
-                    args.append(SearchForm._serialize(arg))
+                    args.append(BaseSearchForm._serialize(arg))
                 q += "[:d = %(op)s(%(args)s)]" % {
                     'op': op,
                     'args': ", ".join(args)
@@ -257,21 +429,6 @@ class SearchForm(object):
         if self.data.get('ref') is None:
             raise RefMissing()
 
-    def submit(self):
-        """
-        Submit the query to the Prismic.io server
-
-        :return: :class:`Response <prismic.api.Response>`
-        """
-        self.submit_assert_preconditions()
-        return Response(get_json(
-            self.action,
-            self.data,
-            self.access_token,
-            self.cache,
-            request_handler=self.request_handler
-        ))
-
     def page(self, page_number):
         """Set query page number
 
@@ -316,13 +473,24 @@ class SearchForm(object):
         """
         return self.page_size(nb_results)
 
-    def count(self):
-        """Count the total number of results
-        """
-        return copy(self).pageSize(1).submit().total_results_size
+    def count_form(self):
+        """Returns the form requesting the smallest response giving the number of results of this form"""
+        form = copy(self)
+        for field in COUNT_IGNORED_FIELDS:
+            form.data.pop(field, None)
+        return form.page_size(1)
+
+    def count_key(self):
+        """Returns the key of the memoized count of this form, the same for all the forms with the same
+        predicates, or None if its ref isn't a master ref."""
+        if self.data.get("ref") not in self.master_refs:
+            return None
+        params = dict((field, sorted(value) if isinstance(value, list) else value)
+                      for field, value in self.data.items() if field not in COUNT_IGNORED_FIELDS)
+        return build_url(self.action, params, self.access_token)
 
     def __copy__(self):
-        cp = type(self)({}, self.access_token, self.cache, self.request_handler)
+        cp = type(self)({}, self.access_token, self.cache, self.request_handler, self.max_stale, self.master_refs)
         cp.action = deepcopy(self.action)
         cp.method = deepcopy(self.method)
         cp.enctype = deepcopy(self.enctype)
@@ -331,6 +499,165 @@ class SearchForm(object):
         return cp
 
 
+class SearchForm(BaseSearchForm):
+    """Form to search for documents. Most of the methods return self object to allow chaining.
+    """
+
+    def submit(self):
+        """
+        Submit the query to the Prismic.io server
+
+        :return: :class:`Response <prismic.api.Response>`
+        """
+        return Response(self.submit_json())
+
+    def submit_json(self):
+        """
+        Submit the query to the Prismic.io server, without parsing the documents
+
+        :return: the JSON response, as a dict
+        """
+        self.submit_assert_preconditions()
+        return get_json(
+            self.action,
+            self.data,
+            self.access_token,
+            self.cache,
+            request_handler=self.request_handler,
+            max_stale=self.max_stale
+        )
+
+    @staticmethod
+    def submit_many(forms, max_workers=8, timeout=None):
+        """Submits several forms in parallel.
+
+        :param forms: array of :class:`SearchForm <SearchForm>`.
+        :param max_workers: maximum number of forms submitted at the same time.
+        :param timeout: number of seconds after which all the forms must have been submitted (optional).
+        :return: array of :class:`Response <Response>`, in the same order as ``forms``. A form whose submission
+                 failed has the exception instead, and a form whose submission did not complete before the timeout
+                 has a :class:`DeadlineExceededError <prismic.exceptions.DeadlineExceededError>`.
+        """
+        return run_concurrently([form.submit for form in forms], max_workers, timeout)
+
+    def submit_all(self, max_workers=4, retries=2):
+        """Fetches the documents of all the pages of the query, starting from the current page.
+
+        Once the first page gives the number of pages, the other ones are fetched in parallel. The pages that fail
+        because of a network error, a server error or a timeout are retried on their own.
+
+        :param max_workers: maximum number of pages fetched at the same time.
+        :param retries: number of times a failed page is retried.
+        :return: array<:class:`Document <Document>`>, in the order of the pages
+        """
+        first_page = int(self.data.get("page") or 1)
+        first = self._submit_pages([first_page], max_workers, retries)[first_page]
+        pages = list(range(first_page + 1, (first.total_pages or 0) + 1))
+        responses = self._submit_pages(pages, max_workers, retries)
+        documents = list(first.documents)
+        for page in pages:
+            documents.extend(responses[page].documents)
+        return documents
+
+    def _submit_pages(self, pages, max_workers, retries):
+        responses = {}
+        for attempt in range(retries + 1):
+            results = run_concurrently([copy(self).page(page).submit for page in pages], max_workers)
+            failed = []
+            for page, result in zip(pages, results):
+                if not isinstance(result, Exception):
+                    responses[page] = result
+                elif attempt < retries and is_retryable(result):
+                    failed.append(page)
+                else:
+                    raise result
+            pages = failed
+            if not pages:
+                break
+        return responses
+
+    def iter_documents(self, prefetch=1):
+        """Iterates over the documents of all the pages of the query, starting from the current page.
+
+        While the documents of a page are consumed, the next pages are fetched in the background.
+
+        :param prefetch: number of pages fetched ahead. With 0, each page is fetched when it is needed.
+        :return: iterator<:class:`Document <Document>`>
+        """
+        page = int(self.data.get("page") or 1)
+        if prefetch <= 0:
+            while True:
+                response = copy(self).page(page).submit()
+                for document in response.documents:
+                    yield document
+                if page >= (response.total_pages or 0):
+                    return
+                page += 1
+
+        executor = ThreadPoolExecutor(max_workers=prefetch)
+        pending = deque([executor.submit(copy(self).page(page).submit)])
+        try:
+            while pending:
+                response = pending.popleft().result()
+                total_pages = response.total_pages or 0
+                while page < total_pages and len(pending) < prefetch:
+                    page += 1
+                    pending.append(executor.submit(copy(self).page(page).submit))
+                for document in response.documents:
+                    yield document
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def iter_after(self, after=None, page_size=100):
+        """Iterates over the documents of the query with keyset pagination: each page is fetched with ``after``
+        set to the id of the last document of the previous one, instead of a page number.
+
+        The cost of a page doesn't grow with its position, and documents added or removed while iterating don't
+        shift the next pages, so nothing is skipped or repeated. The orderings of the form, or the default one of
+        the api, must stay the same during the whole iteration.
+
+        :param after: id of the document to start after (optional), to resume an iteration.
+        :param page_size: number of documents per request.
+        :return: iterator<:class:`Document <Document>`>
+        """
+        form = copy(self).page(1).page_size(page_size)
+        after = after or self.data.get("after")
+        while True:
+            if after is not None:
+                form.after(after)
+            response = form.submit()
+            for document in response.documents:
+                yield document
+            if not response.documents or not response.next_page:
+                return
+            after = response.documents[-1].id
+
+    def count(self):
+        """Count the total number of results
+
+        Only the number of results is read from the response, no document is built. The documents of a
+        master ref never change, so the counts of queries on the master ref are memoized. The counts of
+        release and preview refs are not.
+        """
+        key = self.count_key()
+        count = counts.get(key) if key is not None else None
+        if count is None:
+            count = self.count_form().submit_json()["total_results_size"]
+            if key is not None:
+                counts.set(key, count, 0)
+        return count
+
+    @staticmethod
+    def count_many(forms, max_workers=8, timeout=None):
+        """Counts the results of several forms in parallel.
+
+        :return: array of int, in the same order as ``forms``, with the exception of a count that failed.
+        """
+        return run_concurrently([form.count for form in forms], max_workers, timeout)
+
+
 class Response(object):
     """
     Prismic's response to a query.
@@ -363,6 +690,32 @@ class Response(object):
         return "Response %s" % self._data
 
 
+class IdsResponse(Response):
+    """
+    Prismic's response to :meth:`Api.get_by_ids <Api.get_by_ids>`, merged from the responses of all the chunks.
+
+    :ivar array<prismic.api.Document> documents: the documents found, in the order of the requested ids
+    :ivar OrderedDict by_id: every requested id, in order, to its document, or to None if it is missing
+    :ivar array<str> missing_ids: the requested ids without document
+    """
+
+    def __init__(self, ids, documents):
+        self.by_id = OrderedDict((id, documents.get(id)) for id in ids)
+        self.missing_ids = [id for id in ids if documents.get(id) is None]
+        found = [document for document in self.by_id.values() if document is not None]
+        Response.__init__(self, {
+            "results": [],
+            "page": 1,
+            "results_per_page": len(found),
+            "results_size": len(found),
+            "total_results_size": len(found),
+            "total_pages": 1,
+            "next_page": None,
+            "prev_page": None
+        })
+        self.documents = found
+
+
 class Document(Fragment.WithFragments):
     """
     Represents a Prismic.io Document
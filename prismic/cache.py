@@ -1,10 +1,22 @@
 # -*- coding: utf-8 -*-
 
+import json
 import os
+import re
 import tempfile
 import shelve
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+try:  # 3.x
+    from urllib.parse import unquote_plus
+except ImportError:  # 2.7
+    from urllib import unquote_plus
+
 
 class NoCache(object):
     """
@@ -22,13 +34,262 @@ class NoCache(object):
         return None
 
 
+def estimate_size(val):
+    """Estimates the memory used by a JSON-like value, in bytes."""
+    size = sys.getsizeof(val)
+    if isinstance(val, dict):
+        for k, v in val.items():
+            size += estimate_size(k) + estimate_size(v)
+    elif isinstance(val, (list, tuple)):
+        for v in val:
+            size += estimate_size(v)
+    return size
+
+
+class FrequencySketch(object):
+    """
+    A count-min sketch estimating how often keys were seen recently, used by the TinyLFU admission
+    policy. Counters are halved every ``10 * width`` increments, so old popularity fades away.
+    """
+
+    depth = 4
+
+    def __init__(self, width):
+        self.width = max(int(width), 16)
+        self.table = [[0] * self.width for _ in range(self.depth)]
+        self.additions = 0
+        self.sample_size = 10 * self.width
+
+    def _indexes(self, key):
+        h = hash(key)
+        for i in range(self.depth):
+            yield i, (h ^ (h >> (8 * i + 1)) ^ (i * 0x9E3779B1)) % self.width
+
+    def increment(self, key):
+        for i, j in self._indexes(key):
+            self.table[i][j] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._reset()
+
+    def frequency(self, key):
+        return min(self.table[i][j] for i, j in self._indexes(key))
+
+    def _reset(self):
+        self.table = [[c // 2 for c in row] for row in self.table]
+        self.additions //= 2
+
+
+class MemoryCache(object):
+    """
+    A thread-safe in-memory cache, living as long as the process. This is the default cache backend.
+
+    As with memcached, a ttl of 0 means the entry never expires. Expired entries are removed when read.
+
+    The cache can be bounded by a number of entries and/or by an estimated memory size in bytes; least
+    recently used entries are evicted first. With the ``"tinylfu"`` policy, a new entry is only admitted
+    when it was requested more often than the entry it would evict, which protects popular entries from
+    bursts of one-off queries.
+
+    :param max_entries: maximum number of entries (optional).
+    :param max_bytes: maximum estimated size of the cached values, in bytes (optional).
+    :param policy: ``"lru"`` (default) or ``"tinylfu"``.
+    :param sizeof: function returning the size of a value in bytes. Defaults to :func:`estimate_size`.
+
+    :ivar int hits: number of successful lookups
+    :ivar int misses: number of failed lookups, including expired entries
+    :ivar int evictions: number of entries evicted to respect the bounds
+    :ivar int rejections: number of entries not admitted by the TinyLFU policy or larger than ``max_bytes``
+    :ivar int bytes: current estimated size of the cached values (only tracked when ``max_bytes`` is set)
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, policy="lru", sizeof=None):
+        if policy not in ("lru", "tinylfu"):
+            raise ValueError("Unknown eviction policy %s, valid policies are: lru, tinylfu" % policy)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.sizeof = sizeof or estimate_size
+        self._sketch = FrequencySketch(max_entries or 1024) if policy == "tinylfu" else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+        self.bytes = 0
+
+    def set(self, key, val, ttl=0):
+        expire = time.time() + ttl if ttl else None
+        size = self.sizeof(val) if self.max_bytes is not None else 0
+        with self._lock:
+            replaced = self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejections += 1
+                return
+            if self._sketch is not None:
+                self._sketch.increment(key)
+            while self._entries and self._overflows(size):
+                victim = next(iter(self._entries))
+                if self._sketch is not None and not replaced and \
+                        self._sketch.frequency(key) <= self._sketch.frequency(victim) and \
+                        not self._is_expired(self._entries[victim]):
+                    self.rejections += 1
+                    return
+                self._remove(victim)
+                self.evictions += 1
+            self._entries[key] = (val, expire, size)
+            self.bytes += size
+
+    def get(self, key):
+        with self._lock:
+            if self._sketch is not None:
+                self._sketch.increment(key)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self._is_expired(entry):
+                self._remove(key)
+                self.misses += 1
+                return None
+            # Move the entry to the most recently used end
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Returns the counters of the cache as a dict"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "rejections": self.rejections
+            }
+
+    def _overflows(self, size):
+        if self.max_entries is not None and len(self._entries) + 1 > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.bytes + size > self.max_bytes
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+        return entry is not None
+
+    @staticmethod
+    def _is_expired(entry):
+        return entry[1] is not None and entry[1] < time.time()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RefCache(object):
+    """
+    Wraps another cache to keep the results of queries pinned to a ref for as long as the ref is published.
+
+    The content of a given ref never changes, so the results of queries on a ref listed by the api are
+    cached for ``immutable_ttl`` seconds, whatever the server says. When the api is fetched again and a ref
+    is not listed anymore (for example the master ref after a publication), every entry of this ref is
+    deleted from the wrapped cache, if it has a ``delete`` method. Queries on other refs, such as preview
+    sessions, and the api document itself are cached as usual.
+
+    Entries are tracked per process: with a cache shared between processes, entries written by another
+    process are only removed when they expire or are evicted. At most ``max_keys`` entries are tracked per
+    ref: beyond that, the oldest ones are deleted from the wrapped cache, so ad-hoc queries on a long-lived
+    ref, like fulltext searches, don't grow the tracked keys without limit.
+
+    :param cache: the wrapped cache. Defaults to a :class:`MemoryCache <prismic.cache.MemoryCache>`.
+    :param immutable_ttl: ttl of the results of queries on a published ref, in seconds.
+    :param max_keys: maximum number of entries tracked per ref.
+    """
+
+    # The longest relative ttl understood by memcached
+    IMMUTABLE_TTL = 30 * 24 * 3600
+
+    MAX_KEYS = 10000
+
+    def __init__(self, cache=None, immutable_ttl=IMMUTABLE_TTL, max_keys=MAX_KEYS):
+        self.cache = cache if cache is not None else MemoryCache()
+        self.immutable_ttl = immutable_ttl
+        self.max_keys = max_keys
+        self._keys_by_ref = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def ref_of(key):
+        """Returns the ref of a cache key (the full URL of a query), or None"""
+        m = re.search(r"[?&]ref=([^&]*)", key)
+        return unquote_plus(m.group(1)) if m else None
+
+    def is_immutable(self, key):
+        """Whether the given key is a query on a published ref"""
+        return self.ref_of(key) in self._keys_by_ref
+
+    def set(self, key, val, ttl=0):
+        ref = self.ref_of(key)
+        evicted = []
+        with self._lock:
+            keys = self._keys_by_ref.get(ref)
+            if keys is not None:
+                keys.pop(key, None)
+                keys[key] = True
+                while len(keys) > self.max_keys:
+                    evicted.append(keys.popitem(last=False)[0])
+                ttl = self.immutable_ttl
+        for evicted_key in evicted:
+            self.delete(evicted_key)
+        self.cache.set(key, val, ttl)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def delete(self, key):
+        delete = getattr(self.cache, "delete", None)
+        if delete is not None:
+            delete(key)
+
+    def retain_refs(self, refs):
+        """Declares the refs currently published, and drops the entries of the other refs.
+
+        It is called by :class:`Api <prismic.api.Api>` every time the api is fetched.
+
+        :param refs: the published refs, as strings.
+        """
+        refs = set(refs)
+        with self._lock:
+            superseded = [ref for ref in self._keys_by_ref if ref not in refs]
+            dropped = [self._keys_by_ref.pop(ref) for ref in superseded]
+            for ref in refs:
+                self._keys_by_ref.setdefault(ref, OrderedDict())
+        for keys in dropped:
+            for key in keys:
+                self.delete(key)
+
+
 class ShelveCache(object):
     """
     A cache implementation based on Shelve: https://docs.python.org/2/library/shelve.html.
 
-    By default, it will be created with "filename" equal to the api domain name. If you want to
-    run 2 processes using the same repository, you need to set a different file name to avoid
-    concurrency problems.
+    If you want to run 2 processes using the same repository, you need to set a different file name
+    to avoid concurrency problems.
+
+    Deprecated: use :class:`SQLiteCache <prismic.cache.SQLiteCache>`, which can be shared between processes.
     """
     def __init__(self, filename):
         self.filename = filename
@@ -69,3 +330,122 @@ class ShelveCache(object):
         delta = datetime.now() - epoch
         return delta.total_seconds()
 
+
+class SQLiteCache(object):
+    """
+    A disk cache based on SQLite, which can be shared by all the processes of a host (for example all
+    the workers of a gunicorn server), so they all benefit from the same warm cache.
+
+    The database is opened in WAL mode, so readers never block writers and vice versa. Expired entries
+    are deleted in bulk at most every ``purge_interval`` seconds, at which point the least recently used
+    entries are also deleted if the cache is bigger than ``max_bytes``.
+
+    As with memcached, a ttl of 0 means the entry never expires. The values are stored as JSON, so they must be
+    JSON-like, as the cached api responses are.
+
+    The database file should be in a directory only writable by the user running the processes: it is
+    not created in a shared location like the temp directory.
+
+    :param path: path of the database file, whose directory is created if needed, only accessible to its owner.
+    :param max_bytes: maximum size of the stored values, in bytes (optional).
+    :param purge_interval: minimum number of seconds between two purges.
+    :param timeout: number of seconds to wait for a lock held by another process.
+    """
+
+    # Only refresh the access time of an entry once in a while, so reads rarely need a write lock
+    ACCESS_RESOLUTION = 60
+
+    def __init__(self, path, max_bytes=None, purge_interval=60, timeout=30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.purge_interval = purge_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._last_purge = time.time()
+
+    @property
+    def db(self):
+        """The SQLite connection of the current thread"""
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = self._connect()
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _connect(self):
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            try:
+                os.makedirs(cache_dir, 0o700)
+            except OSError:  # Created by another process in the meantime
+                pass
+        db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS cache ("
+                   "key TEXT PRIMARY KEY, value TEXT NOT NULL, expire REAL, "
+                   "size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS cache_expire ON cache (expire)")
+        db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        return db
+
+    def set(self, key, val, ttl=0):
+        now = time.time()
+        value = json.dumps(val, separators=(",", ":"))
+        self.db.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expire, size, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, value, now + ttl if ttl else None, len(value), now)
+        )
+        if now - self._last_purge >= self.purge_interval:
+            self.purge()
+
+    def get(self, key):
+        now = time.time()
+        row = self.db.execute("SELECT value, expire, accessed FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expire, accessed = row
+        if expire is not None and expire < now:
+            return None
+        if self.max_bytes is not None and now - accessed >= self.ACCESS_RESOLUTION:
+            self.db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value, object_pairs_hook=OrderedDict)
+
+    def delete(self, key):
+        self.db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self.db.execute("DELETE FROM cache")
+
+    def purge(self):
+        """Deletes the expired entries, then the least recently used ones if the cache is too big."""
+        now = time.time()
+        self._last_purge = now
+        db = self.db
+        db.execute("DELETE FROM cache WHERE expire < ?", (now,))
+        if self.max_bytes is None:
+            return
+        size = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        excess = size - self.max_bytes
+        freed = 0
+        keys = []
+        cursor = db.execute("SELECT key, size FROM cache ORDER BY accessed")
+        for key, entry_size in cursor:
+            keys.append(key)
+            freed += entry_size
+            if freed >= excess:
+                break
+        cursor.close()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in keys])
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
@@ -15,60 +15,417 @@ except ImportError:  # 3.x
 
 import requests
 import json
-import re
+import logging
+import os
 import platform
+import threading
+import time
 from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
+from requests.adapters import HTTPAdapter
 from requests.exceptions import InvalidSchema
 from .exceptions import (InvalidTokenError, AuthorizationNeededError,
                          HTTPError, InvalidURLError)
-from .cache import ShelveCache
+from .cache import MemoryCache
+from .utils import SingleFlight, accepts_argument
 from . import __version__ as prismic_version
 
-def get_using_requests(full_url):
-    request = requests.get(full_url, headers={
-        "Accept": "application/json",
-        "User-Agent": "Prismic-python-kit/%s Python/%s" % (
-            prismic_version,
-            platform.python_version()
+log = logging.getLogger(__name__)
+
+
+class SessionRequestHandler(object):
+    """
+    A request handler based on a pooled :class:`requests.Session`, so consecutive queries to the
+    same repository reuse keep-alive connections instead of doing a new TCP and TLS handshake.
+
+    The session is created lazily and recreated automatically in a forked child process, since
+    connections inherited from the parent must not be shared. Pre-fork servers can also call
+    :meth:`reset` explicitly from their post-fork hook.
+
+    :param pool_connections: number of per-host connection pools to keep.
+    :param pool_maxsize: maximum number of connections to keep open per host.
+    :param max_retries: number of retries on connection errors.
+    :param timeout: timeout in seconds for each request (optional).
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=0, timeout=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __call__(self, full_url, headers=None):
+        request_headers = {
+            "Accept": "application/json",
+            "User-Agent": "Prismic-python-kit/%s Python/%s" % (
+                prismic_version,
+                platform.python_version()
+            )
+        }
+        if headers:
+            request_headers.update(headers)
+        response = self.session.get(full_url, headers=request_headers, timeout=self.timeout)
+        return response.status_code, response.text, response.headers
+
+    @property
+    def session(self):
+        """The :class:`requests.Session` of the current process"""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._create_session()
+                    self._pid = pid
+        return self._session
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=self.max_retries
         )
-    })
-    return request.status_code, request.text, request.headers
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
 
-def get_json(url, params=None, access_token=None, cache=None, ttl=None, request_handler=None):
-    full_params = dict() if params is None else params.copy()
+    def reset(self):
+        """Drop the current session and its pooled connections. A new one is created on next use."""
+        if self._pid != os.getpid():
+            # In a forked child, the inherited lock may have been held by another thread of the parent at the
+            # time of the fork, and would never be released: it is replaced instead of acquired. The session is
+            # not closed, as its sockets are still used by the parent
+            self._lock = threading.Lock()
+            self._session = None
+            return
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+default_request_handler = SessionRequestHandler()
+
+
+def get_using_requests(full_url, headers=None):
+    return default_request_handler(full_url, headers)
+
+
+def reset_session():
+    """Reset the pooled session of the default request handler, and forget the fetches and background refreshes
+    in progress, whose threads only exist in the parent process after a fork.
+
+    Call it in the child process after a fork (for example from gunicorn's ``post_fork`` hook), before
+    doing any request. It is called automatically on Python 3.7+.
+    """
+    global inflight_requests, _revalidating, _revalidating_lock, _default_caches_lock
+    default_request_handler.reset()
+    # The locks may have been held by other threads of the parent, so they are replaced rather than released
+    inflight_requests = SingleFlight()
+    _revalidating = set()
+    _revalidating_lock = threading.Lock()
+    _default_caches_lock = threading.Lock()
+
+
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Number of seconds an expired response is kept in the cache to revalidate it with its ETag or Last-Modified
+REVALIDATION_WINDOW = 3600
+
+# Concurrent requests for the same URL are coalesced into a single fetch
+inflight_requests = SingleFlight()
+
+_default_caches = {}
+_default_caches_lock = threading.Lock()
+
+
+def get_default_cache(url):
+    """Returns the process-wide :class:`MemoryCache <prismic.cache.MemoryCache>` used for the repository of
+    the given URL when no cache is passed. It holds at most ``DEFAULT_CACHE_MAX_BYTES`` of data.
+
+    :param url: any URL of the repository, usually the api endpoint.
+    """
+    repository = url.split('/')[2] if url.count('/') >= 2 else url
+    with _default_caches_lock:
+        cache = _default_caches.get(repository)
+        if cache is None:
+            cache = _default_caches[repository] = MemoryCache(max_bytes=DEFAULT_CACHE_MAX_BYTES)
+        return cache
+
+
+def get_json(url, params=None, access_token=None, cache=None, ttl=None, request_handler=None, max_stale=0,
+             default_ttl=None):
+    """Fetches a JSON document from the Prismic api, through the cache.
+
+    :param url: the URL to fetch.
+    :param params: the query parameters (optional).
+    :param access_token: the access token (optional).
+    :param cache: the cache object. Defaults to the cache returned by :func:`get_default_cache`.
+    :param ttl: the number of seconds the response stays fresh. Defaults to the max-age sent by the server.
+    :param default_ttl: the number of seconds the response stays fresh when the server sends no freshness
+                        information (optional).
+    :param request_handler: the request handler. Defaults to :func:`get_using_requests`.
+    :param max_stale: number of seconds an expired response may still be served. It is returned immediately
+                      while a fresh one is fetched in the background, and keeps being served if that fetch
+                      fails.
+    """
     if cache is None:
-        cache = ShelveCache(re.sub(r'/\\', '', url.split('/')[2]))
+        cache = get_default_cache(url)
     if request_handler is None:
         request_handler = get_using_requests
+    full_url = build_url(url, params, access_token)
+
+    entry = cache.get(full_url)
+    if not _is_entry(entry):
+        entry = None
+    now = time.time()
+    if _is_fresh(entry, now):
+        return entry["body"]
+
+    def fetch():
+        return _fetch_json(full_url, access_token, cache, ttl, request_handler, max_stale, entry, default_ttl)
+
+    if _can_serve_stale(entry, now, max_stale):
+        # Failures of the background refresh are logged, and the stale entry keeps being served
+        # until it gets too old
+        _revalidate_in_background(full_url, fetch)
+        return entry["body"]
+    try:
+        return inflight_requests.do(full_url, fetch)
+    except (IOError, HTTPError) as e:
+        if _can_serve_on_error(entry, now, e):
+            log.warning("Serving stale response for %s: %s", full_url, e)
+            return entry["body"]
+        raise
+
+
+def build_url(url, params=None, access_token=None):
+    """Returns the full URL of a request to the api, which is also its cache key"""
+    full_params = dict() if params is None else params.copy()
     if access_token is not None:
         full_params["access_token"] = access_token
-    full_url = url if len(full_params) == 0 else (url + "?" + urlparse.urlencode(full_params, doseq=1))
-    cached = cache.get(full_url)
-    if cached is not None:
-        return cached
+    return url if len(full_params) == 0 else (url + "?" + urlparse.urlencode(full_params, doseq=1))
+
+
+def _is_entry(cached):
+    return isinstance(cached, dict) and "body" in cached and "expires" in cached
+
+
+def _is_fresh(entry, now):
+    return entry is not None and (entry["expires"] is None or now < entry["expires"])
+
+
+def _can_serve_stale(entry, now, max_stale):
+    return entry is not None and \
+        now - entry["expires"] <= max(max_stale, entry.get("stale_while_revalidate") or 0)
+
+
+def _can_serve_on_error(entry, now, error):
+    if isinstance(error, HTTPError) and error.code < 500:
+        return False
+    return entry is not None and now - entry["expires"] <= (entry.get("stale_if_error") or 0)
+
+
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):  # Python >= 3.7
+    os.register_at_fork(after_in_child=reset_session)
+
+
+def _revalidate_in_background(full_url, fetch):
+    with _revalidating_lock:
+        if full_url in _revalidating:
+            return
+        _revalidating.add(full_url)
+
+    def revalidate():
+        try:
+            inflight_requests.do(full_url, fetch)
+        except Exception as e:
+            log.warning("Background refresh of %s failed: %s", full_url, e)
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(full_url)
+
+    thread = threading.Thread(target=revalidate, name="prismic-revalidate")
+    thread.daemon = True
+    thread.start()
+
+
+def _fetch_json(full_url, access_token, cache, ttl, request_handler, max_stale=0, entry=None, default_ttl=None):
+    validators = _conditional_headers(entry)
     try:
-        status_code, text_result, headers = request_handler(full_url)
-        if status_code == 200:
-            json_result = json.loads(text_result, object_pairs_hook=OrderedDict)
-            expire = ttl or get_max_age(headers)
-            if expire is not None:
-                cache.set(full_url, json_result, expire)
-            return json_result
-        elif status_code == 401:
-            if len(access_token) == 0:
-                raise AuthorizationNeededError()
-            else:
-                raise InvalidTokenError()
+        if validators and accepts_argument(request_handler, "headers"):
+            status_code, text_result, headers = request_handler(full_url, headers=validators)
         else:
-            raise HTTPError(status_code, str(text_result))
+            status_code, text_result, headers = request_handler(full_url)
     except InvalidSchema as e:
         raise InvalidURLError(e)
+    if status_code == 304 and validators:
+        # Not modified: extend the lifetime of the entry without downloading the body again
+        body = entry["body"]
+        previous = entry
+    else:
+        body = parse_response(status_code, text_result, access_token)
+        previous = None
+    stored = _cache_entry(cache, full_url, body, headers, ttl, max_stale, previous, default_ttl)
+    if stored is not None:
+        cache.set(full_url, *stored)
+    return body
+
+
+def _conditional_headers(entry):
+    validators = {}
+    if entry is not None:
+        if entry.get("etag"):
+            validators["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            validators["If-Modified-Since"] = entry["last_modified"]
+    return validators
+
+
+def parse_response(status_code, text_result, access_token=None):
+    """Returns the JSON of a successful api response, or raises the matching error"""
+    if status_code == 200:
+        return json.loads(text_result, object_pairs_hook=OrderedDict)
+    elif status_code == 401:
+        if len(access_token) == 0:
+            raise AuthorizationNeededError()
+        else:
+            raise InvalidTokenError()
+    else:
+        raise HTTPError(status_code, str(text_result))
+
+
+def _cache_entry(cache, full_url, body, headers, ttl, max_stale, previous=None, default_ttl=None):
+    """Returns the (entry, ttl) to store in the cache for a response, or None if it must not be stored"""
+    policy = CachePolicy.parse(headers)
+    if previous is not None and get_header(headers, "Cache-Control") is None and get_header(headers, "Expires") is None:
+        # A 304 without freshness information keeps the one of the stored response (RFC 7234 section 4.3.4)
+        policy = CachePolicy(
+            ttl=previous.get("lifetime"),
+            stale_while_revalidate=previous.get("stale_while_revalidate") or 0,
+            stale_if_error=previous.get("stale_if_error") or 0
+        )
+    if policy.no_store:
+        return None
+    immutable = getattr(cache, "is_immutable", None)
+    if immutable is not None and immutable(full_url):
+        return {"body": body, "expires": None}, cache.immutable_ttl
+    etag = get_header(headers, "ETag") or (previous and previous.get("etag"))
+    last_modified = get_header(headers, "Last-Modified") or (previous and previous.get("last_modified"))
+    expire = 0 if policy.no_cache else (ttl or (policy.ttl if policy.ttl is not None else default_ttl))
+    if not expire and not etag and not last_modified:
+        return None
+    keep = (expire or 0) + max(
+        max_stale,
+        policy.stale_while_revalidate,
+        policy.stale_if_error,
+        REVALIDATION_WINDOW if etag or last_modified else 0
+    )
+    return {
+        "body": body,
+        "expires": time.time() + (expire or 0),
+        "lifetime": expire or 0,
+        "etag": etag,
+        "last_modified": last_modified,
+        "stale_while_revalidate": policy.stale_while_revalidate,
+        "stale_if_error": policy.stale_if_error
+    }, keep
+
+
+def get_header(headers, name):
+    """Returns the value of a response header, whatever the case of its name, or None"""
+    value = headers.get(name)
+    if value is None and isinstance(headers, dict):
+        lower_name = name.lower()
+        for key, val in headers.items():
+            if key.lower() == lower_name:
+                return val
+    return value
 
 
 def get_max_age(headers):
-    expire_header = headers.get("Cache-Control", None)
-    if expire_header is not None:
-        m = re.match("max-age=(\d+)", expire_header)
-        if m:
-            return int(m.group(1))
-    return None
+    """Returns the number of seconds a response stays fresh according to its headers, or None"""
+    return CachePolicy.parse(headers).ttl
+
+
+class CachePolicy(object):
+    """
+    The caching rules of a response, from its ``Cache-Control``, ``Age``, ``Expires`` and ``Date`` headers.
+
+    The kit cache is shared by all the users of an application, so ``s-maxage`` takes precedence over
+    ``max-age``, and both over ``Expires``.
+
+    :ivar int ttl: number of seconds the response stays fresh, after deducting its ``Age`` (may be None)
+    :ivar bool no_store: the response must not be cached
+    :ivar bool no_cache: the response must be revalidated before each use
+    :ivar int stale_while_revalidate: number of seconds the response may be served stale while it is refreshed
+    :ivar int stale_if_error: number of seconds the response may be served stale when refreshing it fails
+    """
+
+    def __init__(self, ttl=None, no_store=False, no_cache=False, stale_while_revalidate=0, stale_if_error=0):
+        self.ttl = ttl
+        self.no_store = no_store
+        self.no_cache = no_cache
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+
+    @staticmethod
+    def parse(headers):
+        directives = {}
+        for directive in (get_header(headers, "Cache-Control") or "").split(","):
+            name, _, value = directive.partition("=")
+            directives[name.strip().lower()] = value.strip().strip('"')
+
+        def seconds(name):
+            try:
+                return max(int(directives[name]), 0)
+            except (KeyError, ValueError):
+                return None
+
+        lifetime = seconds("s-maxage")
+        if lifetime is None:
+            lifetime = seconds("max-age")
+        if lifetime is None:
+            lifetime = CachePolicy._expires_lifetime(headers)
+        ttl = None
+        if lifetime is not None:
+            try:
+                age = max(int(get_header(headers, "Age") or 0), 0)
+            except ValueError:
+                age = 0
+            ttl = max(lifetime - age, 0)
+
+        must_revalidate = "must-revalidate" in directives or "proxy-revalidate" in directives
+        no_cache = "no-cache" in directives
+        return CachePolicy(
+            ttl=ttl,
+            no_store="no-store" in directives,
+            no_cache=no_cache,
+            stale_while_revalidate=0 if must_revalidate or no_cache else seconds("stale-while-revalidate") or 0,
+            stale_if_error=0 if must_revalidate else seconds("stale-if-error") or 0
+        )
+
+    @staticmethod
+    def _expires_lifetime(headers):
+        expires = get_header(headers, "Expires")
+        if expires is None:
+            return None
+        expires = _parse_http_date(expires)
+        if expires is None:
+            return 0  # Invalid dates, such as "0", mean already expired
+        date = _parse_http_date(get_header(headers, "Date") or "")
+        return max(int(expires - (date if date is not None else time.time())), 0)
+
+    def __repr__(self):
+        return "CachePolicy %s" % self.__dict__
+
+
+def _parse_http_date(value):
+    parsed = parsedate_tz(value)
+    return mktime_tz(parsed) if parsed is not None else None
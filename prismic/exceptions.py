@@ -58,3 +58,8 @@ class UnexpectedError(Error):
 class RefMissing(Error):
     """You need to provide the ref parameter."""
     pass
+
+
+class DeadlineExceededError(Error):
+    """The deadline expired before the request completed"""
+    pass
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.export
+~~~~~~~~~~~~~~
+
+This module implements the export of the documents of a ref to JSON Lines or msgpack files.
+
+msgpack is optional, and must be installed separately (``pip install prismic[msgpack]``).
+
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import io
+import json
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from .cache import NoCache
+from .utils import is_retryable
+
+FORMATS = ("jsonl", "msgpack")
+
+# Suffix of the file recording the progress of an export, next to the exported file
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+_length = struct.Struct(">I")
+
+
+class Exporter(object):
+    """
+    Writes the raw JSON of the documents of a query, or of the whole ref, to a file, page by page while they are
+    fetched: only ``workers`` pages are held in memory, however large the repository is. Use
+    :meth:`Api.exporter <prismic.api.Api.exporter>` to create one::
+
+        count = api.exporter(workers=8).export("/var/backups/prismic.jsonl")
+
+    The documents are written in the order of the query, either as JSON Lines (``"jsonl"``, one JSON object per
+    line), or as msgpack objects each prefixed by its length as a 4 bytes big-endian integer (``"msgpack"``).
+
+    :meth:`export` records its progress after each page in a checkpoint file, so an interrupted export can be
+    resumed with ``resume=True``. The documents are not cached, so that an export doesn't evict the ones
+    the application is serving.
+
+    :param api: the :class:`Api <prismic.api.Api>`.
+    :param q: the query (optional). Defaults to all the documents.
+    :param ref: the ref to export. Defaults to the master ref, or to the ref of the interrupted export when
+                resuming.
+    :param page_size: number of documents per request.
+    :param fetch_links: the fetchLinks parameter of the queries (optional).
+    :param format: "jsonl" or "msgpack".
+    :param workers: maximum number of pages fetched at the same time.
+    :param retries: number of times a page that failed with a network or server error is fetched again.
+    """
+
+    def __init__(self, api, q=None, ref=None, page_size=100, fetch_links=None, format="jsonl", workers=4,
+                 retries=2):
+        if format not in FORMATS:
+            raise ValueError("Unknown export format %s, valid formats are: %s" % (format, ", ".join(FORMATS)))
+        if format == "msgpack" and msgpack is None:
+            raise ImportError("The msgpack format requires the msgpack package")
+        self.api = api
+        self.q = q
+        self.ref = ref
+        self.page_size = page_size
+        self.fetch_links = fetch_links
+        self.format = format
+        self.workers = max(workers, 1)
+        self.retries = retries
+
+    def export(self, path, resume=False):
+        """Exports the documents to a file.
+
+        :param path: path of the file to write.
+        :param resume: if True and a previous export to the same path was interrupted, continues it instead of
+                       starting over.
+        :return: the number of documents in the file.
+        """
+        checkpoint_path = path + CHECKPOINT_SUFFIX
+        checkpoint = _read_checkpoint(checkpoint_path) if resume else None
+        ref = self.ref or (checkpoint and checkpoint["ref"]) or self.api.get_master().ref
+        form = self._form(ref)
+        state = {
+            "ref": ref,
+            "q": form.data.get("q"),
+            "page_size": self.page_size,
+            "format": self.format,
+            "page": 0,
+            "offset": 0,
+            "documents": 0
+        }
+        if checkpoint is not None:
+            for key in ("ref", "q", "page_size", "format"):
+                if checkpoint[key] != state[key]:
+                    raise ValueError("Can't resume the export to %s, its %s was %s" % (path, key, checkpoint[key]))
+            state = checkpoint
+
+        with io.open(path, "r+b" if checkpoint is not None else "wb") as stream:
+            stream.truncate(state["offset"])
+            stream.seek(state["offset"])
+            for page, data in self._pages(form, state["page"] + 1):
+                for document in data.get("results") or []:
+                    stream.write(self._encode(document))
+                stream.flush()
+                os.fsync(stream.fileno())
+                state["page"] = page
+                state["offset"] = stream.tell()
+                state["documents"] += len(data.get("results") or [])
+                _write_checkpoint(checkpoint_path, state)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return state["documents"]
+
+    def write(self, stream):
+        """Writes the documents to a binary stream, without checkpoints.
+
+        :return: the number of documents written.
+        """
+        count = 0
+        for document in self.documents():
+            stream.write(self._encode(document))
+            count += 1
+        return count
+
+    def documents(self):
+        """Iterates over the raw JSON of the documents, without writing them.
+
+        :return: iterator<dict>
+        """
+        for _, data in self._pages(self._form(self.ref or self.api.get_master().ref), 1):
+            for document in data.get("results") or []:
+                yield document
+
+    def _form(self, ref):
+        form = self.api._query_form(self.q, ref, self.page_size, None, None, None, self.fetch_links)
+        form.cache = NoCache()
+        return form
+
+    def _pages(self, form, first_page):
+        """Yields the page numbers and the JSON of the pages from ``first_page``, in order, fetching up to
+        ``workers`` pages ahead."""
+        first = self._fetch(form, first_page)
+        yield first_page, first
+        total_pages = first.get("total_pages") or 0
+        page = first_page
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        try:
+            while True:
+                while page < total_pages and len(pending) < self.workers:
+                    page += 1
+                    pending.append((page, executor.submit(self._fetch, form, page)))
+                if not pending:
+                    return
+                number, future = pending.popleft()
+                yield number, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _fetch(self, form, page):
+        for attempt in range(self.retries + 1):
+            try:
+                return copy(form).page(page).submit_json()
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+
+    def _encode(self, document):
+        if self.format == "msgpack":
+            data = msgpack.packb(document, use_bin_type=True)
+            return _length.pack(len(data)) + data
+        return (json.dumps(document, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def read_export(path, format="jsonl"):
+    """Iterates over the documents of a file written by an :class:`Exporter <Exporter>`, as raw JSON.
+
+    :param path: path of the file.
+    :param format: "jsonl" or "msgpack".
+    :return: iterator<dict>
+    """
+    if format not in FORMATS:
+        raise ValueError("Unknown export format %s, valid formats are: %s" % (format, ", ".join(FORMATS)))
+    with io.open(path, "rb") as stream:
+        if format == "jsonl":
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line.decode("utf-8"))
+            return
+        if msgpack is None:
+            raise ImportError("The msgpack format requires the msgpack package")
+        while True:
+            header = stream.read(_length.size)
+            if len(header) < _length.size:
+                return
+            yield msgpack.unpackb(stream.read(_length.unpack(header)[0]), raw=False)
+
+
+def _read_checkpoint(path):
+    try:
+        with io.open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path, state):
+    tmp_path = path + ".tmp"
+    with io.open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(state, ensure_ascii=False))
+    getattr(os, "replace", os.rename)(tmp_path, path)
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.filters
+~~~~~~~~~~~~~~~
+
+This module evaluates the predicates of :mod:`prismic.predicates <prismic.predicates>` and the orderings of a
+query over the raw JSON of documents, without the api.
+
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import calendar
+import datetime
+import math
+import re
+
+from .utils import string_types
+
+_DATE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})"
+                   r"(?:[T ](\d{2}):(\d{2})(?::(\d{2}))?(?:\.\d+)?(Z|[+-]\d{2}:?\d{2})?)?$")
+_WORD = re.compile(r"\w+", re.UNICODE)
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+          "november", "december"]
+
+# Mean radius of the Earth in kilometers, the unit of the radius of geopoint.near
+EARTH_RADIUS = 6371.0
+
+# Fields of documents holding a single value
+SCALAR_FIELDS = ("id", "uid", "type", "lang", "first_publication_date", "last_publication_date")
+
+
+def compile(*predicates):
+    """Compiles predicates into a function telling whether the raw JSON of a document matches all of them.
+
+    Field paths and arguments are resolved once, and each operator has its own implementation, so the function
+    is fast enough to filter large numbers of documents::
+
+        is_cheap_product = filters.compile(predicates.at("document.type", "product"),
+                                           predicates.lt("my.product.price", 5))
+        cheap_products = [document for document in documents if is_cheap_product(document)]
+
+    :param predicates: predicates built with :mod:`prismic.predicates <prismic.predicates>`.
+    :return: function(dict) -> bool
+    """
+    tests = []
+    for predicate in predicates:
+        compiler = COMPILERS.get(predicate[0])
+        if compiler is None:
+            raise ValueError("Unsupported predicate %s" % predicate[0])
+        tests.append(compiler(predicate[1], *predicate[2:]))
+    if not tests:
+        return lambda document: True
+    if len(tests) == 1:
+        return tests[0]
+    return lambda document: all(test(document) for test in tests)
+
+
+def matches(document, *predicates):
+    """Whether the raw JSON of a document matches all the predicates. To test many documents, use
+    :func:`compile` instead.
+
+    :param document: the JSON of the document, as returned by the api.
+    :param predicates: predicates built with :mod:`prismic.predicates <prismic.predicates>`.
+    """
+    return compile(*predicates)(document)
+
+
+def field_values(document, path):
+    """Returns the values of a field of a document, as a list since fields like ``document.tags`` or the fields
+    of groups have several values. ``document`` gives the text of all the fragments, for fulltext.
+
+    Links give the id of the linked document, StructuredText fragments their text, and the other fragments
+    their JSON value.
+    """
+    return field_getter(path)(document)
+
+
+def field_getter(path):
+    """Returns a function giving the values of a field of a document, like :func:`field_values`."""
+    if path == "document":
+        return lambda document: list(_texts(document.get("data", {}).get(document.get("type"), {})))
+    parts = path.split(".")
+    if parts[0] == "document":
+        name = parts[1]
+        return lambda document: _as_list(document.get(name))
+    if parts[0] != "my" or len(parts) < 3:
+        return lambda document: []
+    type, name, group_path = parts[1], parts[2], parts[3:]
+
+    def get(document):
+        if document.get("type") != type:
+            return []
+        fragments = _as_list((document.get("data", {}).get(type) or {}).get(name))
+        if not fragments and name == "uid":
+            return _as_list(document.get("uid"))
+        for field in group_path:
+            fragments = [item.get(field) for fragment in fragments if fragment.get("type") == "Group"
+                         for item in fragment.get("value") or [] if item.get(field) is not None]
+        return [_fragment_value(fragment) for fragment in fragments]
+    return get
+
+
+def to_millis(value):
+    """Converts a timestamp in milliseconds, a date or datetime, or a date string of the api like
+    ``2014-06-12`` or ``2014-06-12T15:30:00+0000``, to a timestamp in milliseconds. Returns None otherwise."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime.datetime):
+        if value.utcoffset() is not None:
+            value = value.replace(tzinfo=None) - value.utcoffset()
+        return (value - _EPOCH).total_seconds() * 1000
+    if isinstance(value, datetime.date):
+        return calendar.timegm(value.timetuple()) * 1000
+    if not isinstance(value, string_types):
+        return None
+    match = _DATE.match(value)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, zone = match.groups()
+    seconds = calendar.timegm((int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+                               int(second or 0)))
+    if zone and zone != "Z":
+        offset = int(zone[1:3]) * 60 + int(zone[-2:])
+        seconds -= offset * 60 if zone[0] == "+" else -offset * 60
+    return seconds * 1000
+
+
+def parse_orderings(orderings):
+    """Parses orderings like ``[my.product.price desc, document.id]`` into (path, descending) pairs."""
+    if not orderings:
+        return []
+    result = []
+    for ordering in orderings.strip().strip("[]").split(","):
+        words = ordering.split()
+        if words:
+            result.append((words[0], len(words) > 1 and words[1].lower() == "desc"))
+    return result
+
+
+def sort(documents, orderings):
+    """Returns the raw JSON of documents sorted by orderings like ``[my.product.price desc]``. The documents
+    without a value for a field come after the others."""
+    documents = list(documents)
+    for path, descending in reversed(parse_orderings(orderings)):
+        get = field_getter(path)
+        keys = {}
+        for document in documents:
+            values = get(document)
+            value = values[0] if values else None
+            keys[id(document)] = to_millis(value) if isinstance(value, string_types) and _DATE.match(value) \
+                else value
+        present = [document for document in documents if keys[id(document)] is not None]
+        present.sort(key=lambda document: keys[id(document)], reverse=descending)
+        documents = present + [document for document in documents if keys[id(document)] is None]
+    return documents
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _fragment_value(fragment):
+    fragment_type = fragment.get("type")
+    value = fragment.get("value")
+    if fragment_type == "Link.document":
+        return (value.get("document") or {}).get("id")
+    if fragment_type == "StructuredText":
+        return " ".join(block.get("text") or "" for block in value or [])
+    return value
+
+
+def _texts(fragments):
+    for fragment in fragments.values():
+        for element in _as_list(fragment):
+            if not isinstance(element, dict):
+                continue
+            fragment_type = element.get("type")
+            value = element.get("value")
+            if fragment_type in ("Text", "Select") and isinstance(value, string_types):
+                yield value
+            elif fragment_type == "StructuredText":
+                for block in value or []:
+                    if block.get("text"):
+                        yield block["text"]
+            elif fragment_type == "Group":
+                for item in value or []:
+                    for text in _texts(item):
+                        yield text
+            elif fragment_type == "SliceZone":
+                for slice in value or []:
+                    if "value" in slice:
+                        for text in _texts({"value": slice["value"]}):
+                            yield text
+                    for item in [slice.get("non-repeat") or {}] + (slice.get("repeat") or []):
+                        for text in _texts(item):
+                            yield text
+
+
+def _words(text):
+    return set(word.lower() for word in _WORD.findall(text))
+
+
+def _numbers(values):
+    return [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+
+def _datetimes(values):
+    for value in values:
+        millis = to_millis(value)
+        if millis is not None:
+            yield _EPOCH + datetime.timedelta(milliseconds=millis)
+
+
+def _index(value, names, base):
+    """Converts a day or month, given as a number or as a name, to its number."""
+    if isinstance(value, string_types):
+        return names.index(value.lower()) + base
+    return int(value)
+
+
+def _scalar_getter(path):
+    """Returns a function giving the value of a single valued field of documents, or None for other fields."""
+    parts = path.split(".")
+    if len(parts) == 2 and parts[0] == "document" and parts[1] in SCALAR_FIELDS:
+        name = parts[1]
+        return lambda document: document.get(name)
+    return None
+
+
+def _hashable(values):
+    """Returns the values as a frozenset for constant time membership tests, or as is if they aren't hashable."""
+    try:
+        return frozenset(values)
+    except TypeError:
+        return values
+
+
+def _compile_at(path, value):
+    if isinstance(value, list):
+        get = field_getter(path)
+        expected = _hashable(value)
+
+        def test(document):
+            values = get(document)
+            return all(item in values for item in expected)
+        return test
+    get_scalar = _scalar_getter(path)
+    if get_scalar is not None:
+        return lambda document: get_scalar(document) == value
+    get = field_getter(path)
+    return lambda document: value in get(document)
+
+
+def _compile_not(path, value):
+    test = _compile_at(path, value)
+    return lambda document: not test(document)
+
+
+def _compile_any(path, values):
+    candidates = _hashable(values)
+    get_scalar = _scalar_getter(path)
+    if get_scalar is not None and isinstance(candidates, frozenset):
+        return lambda document: get_scalar(document) in candidates
+    get = field_getter(path)
+    return lambda document: any(value in candidates for value in get(document))
+
+
+def _compile_fulltext(path, text):
+    words = _words(text)
+    get = field_getter(path)
+
+    def test(document):
+        if not words:
+            return False
+        remaining = set(words)
+        for value in get(document):
+            if isinstance(value, string_types):
+                remaining -= _words(value)
+                if not remaining:
+                    return True
+        return False
+    return test
+
+
+def _compile_number(compare):
+    def compiler(path, *bounds):
+        get = field_getter(path)
+        return lambda document: any(compare(value, *bounds) for value in _numbers(get(document)))
+    return compiler
+
+
+def _compile_date(compare):
+    def compiler(path, *bounds):
+        get = field_getter(path)
+        bounds = [to_millis(bound) for bound in bounds]
+        return lambda document: any(compare(millis, *bounds) for millis in map(to_millis, get(document))
+                                    if millis is not None)
+    return compiler
+
+
+def _compile_date_part(part, compare, names=None):
+    def compiler(path, value):
+        get = field_getter(path)
+        expected = _index(value, names, 1) if names else int(value)
+        return lambda document: any(compare(part(date), expected) for date in _datetimes(get(document)))
+    return compiler
+
+
+def _compile_near(path, latitude, longitude, radius):
+    get = field_getter(path)
+    phi = math.radians(latitude)
+    cos_phi = math.cos(phi)
+    # The haversine of the largest central angle in the radius, compared with the one of each point
+    limit = math.sin(min(radius / EARTH_RADIUS, math.pi) / 2) ** 2
+
+    def test(document):
+        for value in get(document):
+            if isinstance(value, dict) and value.get("latitude") is not None and value.get("longitude") is not None:
+                phi2 = math.radians(value["latitude"])
+                a = (math.sin((phi2 - phi) / 2) ** 2 +
+                     cos_phi * math.cos(phi2) * math.sin(math.radians(value["longitude"] - longitude) / 2) ** 2)
+                if a <= limit:
+                    return True
+        return False
+    return test
+
+
+def _eq(a, b):
+    return a == b
+
+
+def _before(a, b):
+    return a < b
+
+
+def _after(a, b):
+    return a > b
+
+
+def _between(value, lower, upper):
+    return lower <= value <= upper
+
+
+def _day_of_week(date):
+    return date.isoweekday()
+
+
+COMPILERS = {
+    "at": _compile_at,
+    "not": _compile_not,
+    "any": _compile_any,
+    "in": _compile_any,
+    "fulltext": _compile_fulltext,
+    "number.gt": _compile_number(_after),
+    "number.lt": _compile_number(_before),
+    "number.inRange": _compile_number(_between),
+    "date.before": _compile_date(_before),
+    "date.after": _compile_date(_after),
+    "date.between": _compile_date(_between),
+    "date.day-of-month": _compile_date_part(lambda date: date.day, _eq),
+    "date.day-of-month-before": _compile_date_part(lambda date: date.day, _before),
+    "date.day-of-month-after": _compile_date_part(lambda date: date.day, _after),
+    "date.day-of-week": _compile_date_part(_day_of_week, _eq, DAYS),
+    "date.day-of-week-before": _compile_date_part(_day_of_week, _before, DAYS),
+    "date.day-of-week-after": _compile_date_part(_day_of_week, _after, DAYS),
+    "date.month": _compile_date_part(lambda date: date.month, _eq, MONTHS),
+    "date.month-before": _compile_date_part(lambda date: date.month, _before, MONTHS),
+    "date.month-after": _compile_date_part(lambda date: date.month, _after, MONTHS),
+    "date.year": _compile_date_part(lambda date: date.year, _eq),
+    "date.hour": _compile_date_part(lambda date: date.hour, _eq),
+    "date.hour-before": _compile_date_part(lambda date: date.hour, _before),
+    "date.hour-after": _compile_date_part(lambda date: date.hour, _after),
+    "geopoint.near": _compile_near
+}
@@ -224,6 +224,8 @@ class Fragment(object):
             self.tags = document.get("tags")
             self.slug = document.get("slug")
             self.is_broken = value.get("isBroken")
+            # The full linked document, once resolved with prismic.links.resolve_links
+            self.document = None
 
             fragments = document.get("data").get(self.type) if "data" in document else {}
             for (fragment_name, fragment_value) in list(fragments.items()):
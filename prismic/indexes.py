@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.indexes
+~~~~~~~~~~~~~~~
+
+This module implements the secondary indexes of a :class:`LocalRepository <prismic.local.LocalRepository>`,
+over the raw JSON of documents.
+
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+from bisect import bisect_left, bisect_right
+
+from .filters import field_getter, to_millis
+
+
+class HashIndex(object):
+    """
+    Maps each value of a field, like ``document.type``, ``document.tags`` or ``my.product.uid``, to the ids of
+    the documents having it. Answers ``at``, ``any`` and ``in`` predicates in constant time per value.
+
+    :param path: the field, as written in predicates.
+    """
+
+    OPERATORS = ("at", "any", "in")
+
+    def __init__(self, path):
+        self.path = path
+        self._get = field_getter(path)
+        self._ids = {}
+
+    def add(self, document):
+        for value in self._keys(document):
+            self._ids.setdefault(value, set()).add(document["id"])
+
+    def add_all(self, documents):
+        for document in documents:
+            self.add(document)
+
+    def remove(self, document):
+        for value in self._keys(document):
+            ids = self._ids.get(value)
+            if ids is not None:
+                ids.discard(document["id"])
+                if not ids:
+                    del self._ids[value]
+
+    def lookup(self, predicate):
+        """Returns the set of the ids of the documents matching a predicate, or None if the index can't tell."""
+        op, args = predicate[0], predicate[2:]
+        if predicate[1] != self.path or op not in self.OPERATORS:
+            return None
+        if op == "at" and isinstance(args[0], list):
+            if not args[0]:
+                return None
+            return _intersection([self._ids.get(value, set()) for value in args[0]])
+        values = args[0] if op != "at" else [args[0]]
+        ids = set()
+        for value in values:
+            ids |= self._ids.get(value, set())
+        return ids
+
+    def _keys(self, document):
+        keys = set()
+        for value in self._get(document):
+            try:
+                keys.add(value)
+            except TypeError:
+                pass
+        return keys
+
+
+class SortedIndex(object):
+    """
+    Keeps the documents sorted by the value of a number or date field, like ``my.product.price``. Answers the
+    ``number.gt``, ``number.lt``, ``number.inRange``, ``date.before``, ``date.after`` and ``date.between``
+    predicates with binary searches. Dates are compared as timestamps in milliseconds.
+
+    :param path: the field, as written in predicates.
+    """
+
+    OPERATORS = ("number.gt", "number.lt", "number.inRange", "date.before", "date.after", "date.between")
+
+    def __init__(self, path):
+        self.path = path
+        self._get = field_getter(path)
+        self._keys = []
+        self._ids = []
+        # Whether each key is a number rather than a date, since number predicates ignore dates
+        self._numbers = []
+
+    def add(self, document):
+        for key, is_number in self._document_keys(document):
+            position = bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._ids.insert(position, document["id"])
+            self._numbers.insert(position, is_number)
+
+    def add_all(self, documents):
+        """Adds many documents, sorting all the keys once rather than inserting them one by one."""
+        entries = list(zip(self._keys, self._ids, self._numbers))
+        for document in documents:
+            entries.extend((key, document["id"], is_number) for key, is_number in self._document_keys(document))
+        # The sort is stable, so documents with equal keys stay in the order they were added, as with add
+        entries.sort(key=lambda entry: entry[0])
+        self._keys = [entry[0] for entry in entries]
+        self._ids = [entry[1] for entry in entries]
+        self._numbers = [entry[2] for entry in entries]
+
+    def remove(self, document):
+        for key, _ in self._document_keys(document):
+            for position in range(bisect_left(self._keys, key), bisect_right(self._keys, key)):
+                if self._ids[position] == document["id"]:
+                    del self._keys[position]
+                    del self._ids[position]
+                    del self._numbers[position]
+                    break
+
+    def lookup(self, predicate):
+        """Returns the set of the ids of the documents matching a predicate, or None if the index can't tell."""
+        op, args = predicate[0], predicate[2:]
+        if predicate[1] != self.path or op not in self.OPERATORS:
+            return None
+        is_date = op.startswith("date.")
+        bounds = [to_millis(arg) for arg in args] if is_date else list(args)
+        if any(not isinstance(bound, (int, float)) or isinstance(bound, bool) for bound in bounds):
+            return None
+        if op in ("number.gt", "date.after"):
+            start, end = bisect_right(self._keys, bounds[0]), len(self._keys)
+        elif op in ("number.lt", "date.before"):
+            start, end = 0, bisect_left(self._keys, bounds[0])
+        else:
+            start, end = bisect_left(self._keys, bounds[0]), bisect_right(self._keys, bounds[1])
+        if is_date:
+            return set(self._ids[start:end])
+        return set(id for id, is_number in zip(self._ids[start:end], self._numbers[start:end]) if is_number)
+
+    def _document_keys(self, document):
+        keys = set()
+        for value in self._get(document):
+            if isinstance(value, bool):
+                continue
+            if isinstance(value, (int, float)):
+                keys.add((value, True))
+            else:
+                millis = to_millis(value)
+                if millis is not None:
+                    keys.add((millis, False))
+        return keys
+
+
+def _intersection(sets):
+    if not sets:
+        return set()
+    sets = sorted(sets, key=len)
+    result = set(sets[0])
+    for other in sets[1:]:
+        result &= other
+    return result
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.links
+~~~~~~~~~~~~~
+
+This module implements the resolution of the document links of many documents at once.
+
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+from collections import OrderedDict
+
+from .fragments import Fragment, StructuredText, Text, Span
+
+
+def document_links(item):
+    """Iterates over the document links of a document or a fragment, including the ones in groups, slices and
+    StructuredText hyperlinks.
+
+    :param item: a :class:`Document <prismic.api.Document>`, or any fragment.
+    :return: iterator<:class:`DocumentLink <prismic.fragments.Fragment.DocumentLink>`>
+    """
+    if isinstance(item, Fragment.DocumentLink):
+        yield item
+    elif isinstance(item, Fragment.WithFragments):
+        for fragment in item.fragments.values():
+            for link in document_links(fragment):
+                yield link
+    elif isinstance(item, Fragment.Group):
+        for element in item.value:
+            for link in document_links(element):
+                yield link
+    elif isinstance(item, StructuredText):
+        for block in item.blocks:
+            if isinstance(block, Text):
+                for span in block.spans:
+                    if isinstance(span, Span.Hyperlink) and isinstance(span.link, Fragment.DocumentLink):
+                        yield span.link
+    elif isinstance(item, Fragment.SliceZone):
+        for slice in item.slices:
+            parts = [slice.value] if isinstance(slice, Fragment.Slice) else [slice.non_repeat, slice.repeat]
+            for part in parts:
+                for link in document_links(part):
+                    yield link
+
+
+def collect_links(documents):
+    """Returns the links of documents which are not broken, and the ids they link to that are not among the
+    documents, in order and without duplicates."""
+    documents = list(documents)
+    known = set(document.id for document in documents)
+    links = [link for document in documents for link in document_links(document) if not link.is_broken]
+    ids = OrderedDict((link.id, True) for link in links if link.id not in known)
+    return links, list(ids)
+
+
+def attach_documents(documents, links, linked):
+    """Sets the ``document`` attribute of links to the linked documents, and adds their fragments to the links,
+    as ``fetchLinks`` would.
+
+    :param documents: the documents the links come from.
+    :param links: the links.
+    :param linked: dict of the fetched documents, by id.
+    :return: dict of the linked documents, by id
+    """
+    by_id = dict((document.id, document) for document in documents)
+    by_id.update(linked)
+    result = OrderedDict()
+    for link in links:
+        document = by_id.get(link.id)
+        if document is None:
+            continue
+        link.document = document
+        link.fragments.update(document.fragments)
+        result[link.id] = document
+    return result
+
+
+def resolve_links(api, documents, ref=None, fetch_links=None, max_workers=4):
+    """Fetches the documents linked from documents, in a few queries.
+
+    The links are collected from all the documents, deduplicated, and the linked documents which are not among
+    the documents themselves are fetched with :meth:`Api.get_by_ids <prismic.api.Api.get_by_ids>`: chunked
+    ``in`` queries sent in parallel. Each link then gets the full document as its ``document`` attribute, and its
+    fragments.
+
+    :param api: the :class:`Api <prismic.api.Api>`.
+    :param documents: a :class:`Response <prismic.api.Response>`, or array of
+                      :class:`Document <prismic.api.Document>`.
+    :param ref: the ref to fetch the linked documents from. Defaults to the master ref.
+    :param fetch_links: the fetchLinks parameter of the queries (optional).
+    :param max_workers: maximum number of queries running at the same time.
+    :return: dict of the linked documents, by id. Missing documents are left out.
+    """
+    documents = list(getattr(documents, "documents", documents))
+    links, ids = collect_links(documents)
+    linked = {}
+    if ids:
+        response = api.get_by_ids(ids, ref, fetch_links=fetch_links, max_workers=max_workers)
+        linked = dict((document.id, document) for document in response.documents)
+    return attach_documents(documents, links, linked)
+
+
+def prefetch_graph(api, documents, depth=2, max_documents=1000, ref=None, fetch_links=None, max_workers=4):
+    """Fetches the documents linked from documents, breadth-first, up to ``depth`` links away.
+
+    Each level is fetched with :meth:`Api.get_by_ids <prismic.api.Api.get_by_ids>`, in parallel chunks, and only
+    the documents not seen yet are fetched, so cycles end the walk. The links of all the documents get their
+    linked document, as with :func:`resolve_links`.
+
+    :param api: the :class:`Api <prismic.api.Api>`.
+    :param documents: a :class:`Response <prismic.api.Response>`, or array of
+                      :class:`Document <prismic.api.Document>`.
+    :param depth: maximum number of links between the documents and the fetched ones.
+    :param max_documents: maximum number of documents in the result, including the given ones.
+    :param ref: the ref to fetch the linked documents from. Defaults to the master ref.
+    :param fetch_links: the fetchLinks parameter of the queries (optional).
+    :param max_workers: maximum number of queries running at the same time.
+    :return: OrderedDict of the given and fetched documents, by id, level by level
+    """
+    walk = GraphWalk(documents, max_documents)
+    for _ in range(depth):
+        ids = walk.next_ids()
+        if not ids:
+            break
+        walk.add_level(api.get_by_ids(ids, ref, fetch_links=fetch_links, max_workers=max_workers).documents)
+    return walk.finish()
+
+
+class GraphWalk(object):
+    """
+    The state of a breadth-first walk of the links of documents, shared by the synchronous and asynchronous
+    versions of :func:`prefetch_graph`: they fetch the ids given by :meth:`next_ids`, pass the documents
+    to :meth:`add_level`, and finally call :meth:`finish`.
+    """
+
+    def __init__(self, documents, max_documents):
+        self.documents = OrderedDict()
+        self.max_documents = max_documents
+        self._frontier = list(getattr(documents, "documents", documents))
+        for document in self._frontier:
+            self.documents[document.id] = document
+        self._visited = set(self.documents)
+        self._links = []
+
+    def next_ids(self):
+        """Returns the ids linked from the last level which were not fetched yet, within the limit."""
+        links, ids = collect_links(self._frontier)
+        self._links.extend(links)
+        self._frontier = []
+        ids = [id for id in ids if id not in self._visited][:max(self.max_documents - len(self.documents), 0)]
+        self._visited.update(ids)
+        return ids
+
+    def add_level(self, documents):
+        for document in documents:
+            self.documents[document.id] = document
+        self._frontier = list(documents)
+
+    def finish(self):
+        """Attaches the fetched documents to the links, and returns all the documents by id."""
+        self._links.extend(collect_links(self._frontier)[0])
+        self._frontier = []
+        attach_documents(list(self.documents.values()), self._links, {})
+        return self.documents
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.loader
+~~~~~~~~~~~~~~
+
+This module implements the batching of document lookups by id or uid.
+
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import threading
+from collections import OrderedDict
+
+from . import predicates
+from .connection import urlparse
+
+# The largest page size accepted by the api
+MAX_PAGE_SIZE = 100
+
+# Maximum length of the URL-encoded values of an "in" predicate, to keep URLs well below the usual limits
+MAX_VALUES_LENGTH = 2000
+
+
+class Deferred(object):
+    """
+    The result of a lookup queued in a :class:`DocumentLoader <DocumentLoader>`. Reading it dispatches all the
+    lookups queued so far, in a few batched queries.
+    """
+
+    def __init__(self, loader, key):
+        self._loader = loader
+        self._key = key
+
+    def get(self):
+        """Returns the :class:`Document <prismic.api.Document>`, or None if it doesn't exist.
+        Raises the error of the query if it failed."""
+        return self._loader._result(self._key)
+
+    def __repr__(self):
+        return "Deferred %s" % (self._key,)
+
+
+class DocumentLoader(object):
+    """
+    Collects the lookups of documents by id or uid, and fetches them in as few queries as possible: the ids,
+    and the uids of each type, are deduplicated and fetched with ``in`` predicates of up to ``batch_size`` values,
+    in parallel. Results are memoized, so a loader should live as long as a request. Use
+    :meth:`Api.loader <prismic.api.Api.loader>` to create one.
+
+    Lookups are queued with :meth:`load` and :meth:`load_by_uid`, which return :class:`Deferred <Deferred>`
+    objects. All the lookups queued so far are dispatched when the first one is read::
+
+        products = [loader.load(link.id) for link in links]
+        author = loader.load_by_uid("author", "john")
+        for product in products:
+            print(product.get())  # Only 2 queries, for the products and the author
+
+    :param api: the :class:`Api <prismic.api.Api>`.
+    :param ref: the ref to query. Defaults to the master ref.
+    :param batch_size: maximum number of values in a predicate, and page size of the queries.
+    :param max_workers: maximum number of queries running at the same time.
+    :param fetch_links: the fetchLinks parameter of the queries (optional).
+    """
+
+    def __init__(self, api, ref=None, batch_size=MAX_PAGE_SIZE, max_workers=4, fetch_links=None):
+        self.api = api
+        self.ref = ref
+        self.batch_size = min(batch_size, MAX_PAGE_SIZE)
+        self.max_workers = max_workers
+        self.fetch_links = fetch_links
+        self._results = {}
+        self._pending = OrderedDict()
+        self._lock = threading.RLock()
+
+    def load(self, id):
+        """Queues the lookup of a document by id.
+
+        :return: :class:`Deferred <Deferred>`
+        """
+        return self._queue(("id", id))
+
+    def load_by_uid(self, type, uid):
+        """Queues the lookup of a document by type and uid.
+
+        :return: :class:`Deferred <Deferred>`
+        """
+        return self._queue(("uid", type, uid))
+
+    def load_many(self, ids):
+        """Queues the lookup of several documents by id.
+
+        :return: array<:class:`Deferred <Deferred>`>
+        """
+        return [self.load(id) for id in ids]
+
+    def get_by_id(self, id):
+        """Returns a document by id, dispatching all the queued lookups with it."""
+        return self.load(id).get()
+
+    def get_by_uid(self, type, uid):
+        """Returns a document by type and uid, dispatching all the queued lookups with it."""
+        return self.load_by_uid(type, uid).get()
+
+    def get_by_ids(self, ids):
+        """Returns documents by id, in the same order, with None for the missing ones."""
+        return [deferred.get() for deferred in self.load_many(ids)]
+
+    def prime(self, document):
+        """Adds an already fetched document to the loader, so it won't be queried."""
+        with self._lock:
+            self._results[("id", document.id)] = (document, None)
+            if document.uid is not None:
+                self._results[("uid", document.type, document.uid)] = (document, None)
+
+    def dispatch(self):
+        """Fetches all the queued lookups."""
+        with self._lock:
+            pending, self._pending = list(self._pending), OrderedDict()
+            if not pending:
+                return
+            batches = []
+            ids = [key[1] for key in pending if key[0] == "id"]
+            for chunk in url_safe_chunks(ids, self.batch_size):
+                batches.append((chunk, "document.id"))
+            uids_by_type = OrderedDict()
+            for key in pending:
+                if key[0] == "uid":
+                    uids_by_type.setdefault(key[1], []).append(key[2])
+            for type, uids in uids_by_type.items():
+                for chunk in url_safe_chunks(uids, self.batch_size):
+                    batches.append((chunk, "my.%s.uid" % type))
+
+            responses = self.api.query_many([{
+                "q": predicates.in_(field, chunk),
+                "ref": self.ref,
+                "page_size": len(chunk),
+                "fetch_links": self.fetch_links
+            } for (chunk, field) in batches], max_workers=self.max_workers)
+
+            for (chunk, field), response in zip(batches, responses):
+                if isinstance(response, Exception):
+                    for value in chunk:
+                        self._results[_key(field, value)] = (None, response)
+                    continue
+                for value in chunk:
+                    self._results[_key(field, value)] = (None, None)
+                for document in response.documents:
+                    self.prime(document)
+
+    def _queue(self, key):
+        with self._lock:
+            if key not in self._results:
+                self._pending[key] = True
+        return Deferred(self, key)
+
+    def _result(self, key):
+        with self._lock:
+            if key not in self._results:
+                self.dispatch()
+            document, error = self._results[key]
+        if error is not None:
+            raise error
+        return document
+
+
+def _key(field, value):
+    if field == "document.id":
+        return "id", value
+    return "uid", field.split(".")[1], value
+
+
+def url_safe_chunks(values, max_count=MAX_PAGE_SIZE, max_length=MAX_VALUES_LENGTH):
+    """Splits values into chunks of at most ``max_count`` values, whose URL-encoded length in a predicate is at
+    most ``max_length``."""
+    chunks = []
+    chunk = []
+    length = 0
+    for value in values:
+        value_length = len(urlparse.quote_plus('"%s", ' % value))
+        if chunk and (len(chunk) >= max_count or length + value_length > max_length):
+            chunks.append(chunk)
+            chunk = []
+            length = 0
+        chunk.append(value)
+        length += value_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.local
+~~~~~~~~~~~~~
+
+This module implements a replica of the documents of a ref, held in memory and queried locally.
+
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+from collections import OrderedDict
+
+from . import filters, predicates
+from .api import Document, Response, IdsResponse
+from .export import read_export
+from .indexes import HashIndex, SortedIndex
+from .sync import sync
+from .utils import string_types
+
+# The page size of the api when none is given
+DEFAULT_PAGE_SIZE = 20
+
+# The fields indexed by every repository
+DEFAULT_INDEXES = ("document.type", "document.uid", "document.tags")
+
+INDEX_KINDS = {
+    "hash": HashIndex,
+    "sorted": SortedIndex
+}
+
+
+class LocalRepository(object):
+    """
+    The documents of a ref, held in memory, answering the queries of :class:`Api <prismic.api.Api>` without
+    any request: lookups by id or uid are dictionary lookups, and the other queries are compiled with
+    :func:`prismic.filters.compile <prismic.filters.compile>`::
+
+        local = LocalRepository.from_api(api)
+        doc = local.get_by_uid("product", "speculoos-macaron")
+        response = local.query(predicates.at("document.type", "product"), orderings="[my.product.price]")
+
+    The predicates on ``document.id``, and on the indexed fields, are answered by the indexes, and only the
+    documents they select are tested against the other predicates. ``document.type``, ``document.uid`` and
+    ``document.tags`` are always indexed, and :meth:`create_index` adds indexes, for example a sorted one on a
+    number or date field queried with ranges.
+
+    The repository holds a single ref, so the ``ref`` arguments of the queries are ignored, and so is
+    ``fetch_links``: links have the fields fetched when the documents were loaded.
+
+    :param documents: the raw JSON of the documents, as returned by the api or read from an export.
+    :param ref: the ref of the documents (optional).
+    :param q: the predicates the documents were loaded with (optional), so that :meth:`sync` only loads the
+              documents matching them.
+    """
+
+    def __init__(self, documents=(), ref=None, q=None):
+        self.ref = ref
+        self.q = q
+        self._documents = OrderedDict()
+        self._positions = {}
+        self._count = 0
+        self._ids_by_uid = {}
+        self._indexes = [HashIndex(path) for path in DEFAULT_INDEXES]
+        for document in documents:
+            self.add(document)
+
+    def create_index(self, path, kind="hash"):
+        """Indexes a field of the documents.
+
+        :param path: the field, as written in predicates, like ``my.product.category``.
+        :param kind: "hash" for ``at``, ``any`` and ``in`` predicates, or "sorted" for the ``number`` and
+                     ``date`` range predicates.
+        """
+        if kind not in INDEX_KINDS:
+            raise ValueError("Unknown index kind %s, valid kinds are: %s" % (kind, ", ".join(INDEX_KINDS)))
+        index = INDEX_KINDS[kind](path)
+        index.add_all(self._documents.values())
+        self._indexes.append(index)
+        return index
+
+    @classmethod
+    def from_api(cls, api, ref=None, q=None, page_size=100, workers=4):
+        """Loads all the documents of a ref, or the ones of a query, from the api.
+
+        :param api: the :class:`Api <prismic.api.Api>`.
+        :param ref: the ref to load. Defaults to the master ref.
+        :param q: a predicate, or a list of predicates (optional). The repository keeps it to :meth:`sync`.
+        :param workers: maximum number of pages fetched at the same time.
+        """
+        ref = getattr(ref, "ref", ref) or api.get_master().ref
+        return cls(api.exporter(q, ref, page_size, workers=workers).documents(), ref, q)
+
+    @classmethod
+    def from_export(cls, path, format="jsonl", ref=None):
+        """Loads the documents of a file written by an :class:`Exporter <prismic.export.Exporter>`."""
+        return cls(read_export(path, format), ref)
+
+    def sync(self, api, ref=None, page_size=100, workers=4):
+        """Updates the repository to a new ref, by default the master ref, fetching only the documents published
+        since its ref. See :func:`prismic.sync.sync <prismic.sync.sync>`.
+
+        :return: :class:`Changes <prismic.sync.Changes>`
+        """
+        return sync(self, api, ref, page_size, workers)
+
+    def add(self, document):
+        """Adds or replaces a document, given its raw JSON."""
+        self.remove(document["id"])
+        self._documents[document["id"]] = document
+        self._positions[document["id"]] = self._count
+        self._count += 1
+        for index in self._indexes:
+            index.add(document)
+        if document.get("uid") is not None:
+            self._ids_by_uid[(document.get("type"), document["uid"])] = document["id"]
+
+    def remove(self, id):
+        """Removes a document by id. Returns whether it was there."""
+        document = self._documents.pop(id, None)
+        if document is None:
+            return False
+        del self._positions[id]
+        for index in self._indexes:
+            index.remove(document)
+        if self._ids_by_uid.get((document.get("type"), document.get("uid"))) == id:
+            del self._ids_by_uid[(document.get("type"), document.get("uid"))]
+        return True
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, id):
+        return id in self._documents
+
+    def __iter__(self):
+        return iter(self._documents.values())
+
+    def query(self, q=None, ref=None, page_size=None, page=None, orderings=None, after=None, fetch_links=None):
+        """Runs a query like :meth:`Api.query <prismic.api.Api.query>`.
+
+        :param q: a predicate, a list of predicates, or None for all the documents.
+        :return: :class:`Response <prismic.api.Response>`, whose ``next_page`` and ``prev_page`` are None
+        """
+        documents = self._select(q)
+        if orderings:
+            documents = filters.sort(documents, orderings)
+        if after is not None:
+            ids = [document["id"] for document in documents]
+            documents = documents[ids.index(after) + 1:] if after in ids else []
+        page = int(page or 1)
+        page_size = int(page_size or DEFAULT_PAGE_SIZE)
+        results = documents[(page - 1) * page_size:page * page_size]
+        return Response({
+            "page": page,
+            "results_per_page": page_size,
+            "results_size": len(results),
+            "total_results_size": len(documents),
+            "total_pages": (len(documents) + page_size - 1) // page_size,
+            "next_page": None,
+            "prev_page": None,
+            "results": results
+        })
+
+    def query_first(self, q, ref=None):
+        documents = self.query(q, page_size=1).documents
+        if documents:
+            return documents[0]
+
+    def get_by_id(self, id, ref=None):
+        document = self._documents.get(id)
+        return Document(document) if document is not None else None
+
+    def get_by_uid(self, type, uid, ref=None):
+        return self.get_by_id(self._ids_by_uid.get((type, uid)))
+
+    def get_by_ids(self, ids, ref=None, page_size=None, page=None, orderings=None, after=None, fetch_links=None):
+        """Fetches documents by id, see :meth:`Api.get_by_ids <prismic.api.Api.get_by_ids>`."""
+        if page_size is not None or page is not None or orderings is not None or after is not None:
+            return self.query(predicates.in_("document.id", ids), page_size=page_size, page=page,
+                              orderings=orderings, after=after)
+        unique_ids = list(OrderedDict.fromkeys(ids))
+        return IdsResponse(unique_ids, dict(
+            (id, Document(self._documents[id])) for id in unique_ids if id in self._documents
+        ))
+
+    def get_single(self, type, ref=None):
+        return self.query_first(predicates.at("document.type", type))
+
+    def _select(self, q):
+        if q is None:
+            return list(self._documents.values())
+        if isinstance(q, string_types):
+            raise ValueError("Query strings are not supported locally, use the helpers of prismic.predicates")
+        q = [q] if q and isinstance(q[0], string_types) else q
+        ids = None
+        remaining = []
+        for predicate in q:
+            matching = self._lookup(predicate)
+            if matching is None:
+                remaining.append(predicate)
+            else:
+                ids = matching if ids is None else ids & matching
+        if ids is None:
+            documents = self._documents.values()
+        else:
+            documents = [self._documents[id] for id in sorted(ids, key=self._positions.get)]
+        test = filters.compile(*remaining)
+        return [document for document in documents if test(document)]
+
+    def _lookup(self, predicate):
+        """Returns the ids of the documents matching a predicate according to the indexes, or None."""
+        if predicate[1] == "document.id" and predicate[0] in HashIndex.OPERATORS:
+            values = predicate[2] if isinstance(predicate[2], list) else [predicate[2]]
+            if predicate[0] == "at" and len(values) != 1:
+                return None
+            return set(id for id in values if id in self._documents)
+        for index in self._indexes:
+            ids = index.lookup(predicate)
+            if ids is not None:
+                return ids
+        return None
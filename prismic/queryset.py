@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.queryset
+~~~~~~~~~~~~~~~~
+
+This module implements lazy queries, which fetch only the documents that are used.
+
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+from .loader import MAX_PAGE_SIZE
+
+
+class QuerySet(object):
+    """
+    A query which is only sent when its documents are used. Use :meth:`Api.query_set
+    <prismic.api.Api.query_set>` to create one::
+
+        products = api.query_set(predicates.at("document.type", "product")).order_by("[my.product.price]")
+        total = len(products)    # A request for the count only
+        for product in products[20:30]:    # A request for the 10 documents
+            print(product.id)
+
+    Chaining :meth:`filter`, :meth:`order_by`, :meth:`fetch`, :meth:`fetch_links` and :meth:`with_ref` returns a
+    new query set without any request. ``len()`` fetches the number of documents. Indexing and slicing fetch the
+    documents with as few requests as possible, choosing the page size so that the range fits in a few pages,
+    fetched in parallel. The fetched documents and the count are memoized, so a query set should live as long
+    as a request.
+
+    :param api: the :class:`Api <prismic.api.Api>`.
+    :param predicates: the predicates of the query.
+    :param max_workers: maximum number of pages fetched at the same time.
+    """
+
+    def __init__(self, api, predicates=(), ref=None, orderings=None, fetch=None, fetch_links=None, max_workers=4):
+        self.api = api
+        self.predicates = list(predicates)
+        self.ref = ref
+        self.orderings = orderings
+        self.fields = fetch
+        self.link_fields = fetch_links
+        self.max_workers = max_workers
+        self._documents = {}
+        self._count = None
+
+    def filter(self, *predicates):
+        """Returns a query set with more predicates."""
+        return self._clone(predicates=self.predicates + list(predicates))
+
+    def order_by(self, orderings):
+        """Returns a query set with orderings, like ``[my.product.price desc]``."""
+        return self._clone(orderings=orderings)
+
+    def fetch(self, fields):
+        """Returns a query set restricting the documents to fields."""
+        return self._clone(fetch=fields)
+
+    def fetch_links(self, fields):
+        """Returns a query set including fields of the linked documents."""
+        return self._clone(fetch_links=fields)
+
+    def with_ref(self, ref):
+        """Returns a query set on another ref."""
+        return self._clone(ref=ref)
+
+    def count(self):
+        """Returns the number of documents, fetching it if it isn't known yet."""
+        if self._count is None:
+            self._count = self._form().count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                raise ValueError("Query sets don't support slice steps")
+            if (key.start or 0) < 0 or key.stop is None or key.stop < 0:
+                start, stop, _ = key.indices(self.count())
+            else:
+                start, stop = key.start or 0, key.stop
+            self._fetch_range(start, stop)
+            return [self._documents[index] for index in range(start, stop) if index in self._documents]
+        if not isinstance(key, int):
+            raise TypeError("Query set indices must be integers or slices")
+        if key < 0:
+            key += self.count()
+        self._fetch_range(key, key + 1)
+        if key not in self._documents:
+            raise IndexError("Query set index out of range")
+        return self._documents[key]
+
+    def __iter__(self):
+        index = 0
+        while self._count is None or index < self._count:
+            self._fetch_range(index, index + MAX_PAGE_SIZE)
+            if index not in self._documents:
+                return
+            while index in self._documents:
+                yield self._documents[index]
+                index += 1
+
+    def first(self):
+        """Returns the first document, or None."""
+        documents = self[0:1]
+        return documents[0] if documents else None
+
+    def __repr__(self):
+        return "QuerySet %s" % self.predicates
+
+    def _clone(self, **changes):
+        arguments = {
+            "predicates": self.predicates,
+            "ref": self.ref,
+            "orderings": self.orderings,
+            "fetch": self.fields,
+            "fetch_links": self.link_fields,
+            "max_workers": self.max_workers
+        }
+        arguments.update(changes)
+        return type(self)(self.api, **arguments)
+
+    def _form(self, page_size=None, page=None):
+        form = self.api.form("everything").ref(self.ref or self.api.get_master())
+        if self.predicates:
+            form.query(*self.predicates)
+        if self.orderings:
+            form.orderings(self.orderings)
+        if self.fields:
+            form.fetch(self.fields)
+        if self.link_fields:
+            form.fetch_links(self.link_fields)
+        if page_size is not None:
+            form.page_size(page_size)
+        if page is not None:
+            form.page(page)
+        return form
+
+    def _fetch_range(self, start, stop):
+        """Fetches the documents from index ``start`` to ``stop`` (excluded) which are not fetched yet."""
+        if self._count is not None:
+            stop = min(stop, self._count)
+        missing = [index for index in range(start, stop) if index not in self._documents]
+        if not missing:
+            return
+        page_size, first_page, last_page = plan_pages(missing[0], missing[-1] + 1)
+        pages = list(range(first_page, last_page + 1))
+        forms = [self._form(page_size, page) for page in pages]
+        responses = forms[0].submit_many(forms, self.max_workers)
+        for page, response in zip(pages, responses):
+            if isinstance(response, Exception):
+                raise response
+            self._count = response.total_results_size
+            for offset, document in enumerate(response.documents):
+                self._documents[(page - 1) * page_size + offset] = document
+
+
+def plan_pages(start, stop, max_page_size=MAX_PAGE_SIZE):
+    """Returns the page size, first page and last page (starting at 1) to fetch to get the documents from
+    index ``start`` to ``stop`` (excluded) in as few requests as possible, then fetching as few documents
+    as possible."""
+    best = None
+    for page_size in range(1, max_page_size + 1):
+        first_page, last_page = start // page_size, (stop - 1) // page_size
+        cost = (last_page - first_page + 1, (last_page - first_page + 1) * page_size)
+        if best is None or cost < best[0]:
+            best = (cost, page_size, first_page + 1, last_page + 1)
+        if cost[0] == 1:
+            break
+    return best[1:]
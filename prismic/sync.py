@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+prismic.sync
+~~~~~~~~~~~~
+
+This module implements the incremental update of a :class:`LocalRepository <prismic.local.LocalRepository>`
+from one ref to the next.
+
+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+from collections import namedtuple
+
+from . import predicates
+from .filters import to_millis
+from .utils import run_concurrently, string_types
+
+# Milliseconds before the last publication date of the previous ref from which documents are fetched again,
+# for the ones published in the same second as it
+SYNC_OVERLAP = 1000
+
+Changes = namedtuple("Changes", ["ref", "updated", "deleted"])
+Changes.__doc__ = """The changes applied by :func:`sync`: the new ref, and the ids of the updated and deleted
+documents."""
+
+
+def sync(repository, api, ref=None, page_size=100, workers=4):
+    """Updates a repository to a new ref, fetching only the documents published since its ref.
+
+    The documents published after the last publication date of the repository are fetched, while the number of
+    documents of the new ref is counted. Only if it shows that documents were deleted, the ids of all the
+    documents are listed to find them. A repository without publication dates is loaded again entirely.
+
+    If the repository was loaded with predicates, as its ``q``, all these queries are restricted to them, and
+    the documents which stopped matching them are deleted.
+
+    :param repository: the :class:`LocalRepository <prismic.local.LocalRepository>`.
+    :param api: the :class:`Api <prismic.api.Api>`.
+    :param ref: the new ref. Defaults to the master ref.
+    :param page_size: number of documents per request.
+    :param workers: maximum number of requests running at the same time.
+    :return: :class:`Changes <Changes>`
+    """
+    ref = getattr(ref, "ref", ref) or api.get_master().ref
+    if ref == repository.ref:
+        return Changes(ref, [], [])
+    scope = _predicates(getattr(repository, "q", None))
+    since = last_publication_date(repository)
+    if since is None:
+        documents = list(api.exporter(scope or None, ref, page_size, workers=workers).documents())
+        deleted = _deleted(repository, documents)
+    else:
+        q = scope + [predicates.date_after("document.last_publication_date", int(since) - SYNC_OVERLAP)]
+        documents, total = run_concurrently([
+            lambda: list(api.exporter(q, ref, page_size, workers=workers).documents()),
+            lambda: api._query_form(scope or None, ref, 1).submit_json()["total_results_size"]
+        ], max_workers=2)
+        for result in (documents, total):
+            if isinstance(result, Exception):
+                raise result
+        deleted = []
+        if len(set(_ids(repository)) | set(_ids(documents))) != total:
+            deleted = _deleted(repository, api.exporter(scope or None, ref, page_size, workers=workers).documents())
+    for document in documents:
+        repository.add(document)
+    for id in deleted:
+        repository.remove(id)
+    repository.ref = ref
+    return Changes(ref, _ids(documents), deleted)
+
+
+def last_publication_date(documents):
+    """Returns the latest publication date of the raw JSON of documents, in milliseconds, or None."""
+    dates = [to_millis(document.get("last_publication_date")) for document in documents]
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def _predicates(q):
+    """Returns the predicates of a query, as a list"""
+    if q is None:
+        return []
+    if isinstance(q, string_types):
+        raise ValueError("Query strings can't be synced, use the helpers of prismic.predicates")
+    return [q] if q and isinstance(q[0], string_types) else list(q)
+
+
+def _ids(documents):
+    return [document["id"] for document in documents]
+
+
+def _deleted(repository, documents):
+    ids = set(_ids(documents))
+    return [id for id in _ids(repository) if id not in ids]
@@ -8,7 +8,17 @@ This module is mostly for internal use.
 
 """
 
+import inspect
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .exceptions import HTTPError, DeadlineExceededError
+
+try:
+    import asyncio
+except ImportError:  # 2.7
+    asyncio = None
 
 
 PY3 = sys.version_info[0] == 3
@@ -17,3 +27,146 @@ if PY3:
     string_types = str
 else:
     string_types = basestring
+
+
+def accepts_argument(fn, name):
+    """Whether the callable ``fn`` can be called with the keyword argument ``name``"""
+    try:
+        if PY3:
+            parameters = inspect.signature(fn).parameters
+            return name in parameters or \
+                any(p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters.values())
+        if not (inspect.isfunction(fn) or inspect.ismethod(fn)):
+            fn = fn.__call__
+        spec = inspect.getargspec(fn)
+        return name in spec.args or spec.keywords is not None
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+def run_concurrently(calls, max_workers=8, timeout=None):
+    """Runs callables on a bounded thread pool.
+
+    :param calls: the callables to run, without arguments.
+    :param max_workers: maximum number of callables running at the same time.
+    :param timeout: number of seconds after which the results are returned anyway (optional).
+    :return: the results in the same order as ``calls``. A callable that raised an exception has this exception
+             as its result; a callable that did not complete before the timeout has a
+             :class:`DeadlineExceededError <prismic.exceptions.DeadlineExceededError>`.
+    """
+    calls = list(calls)
+    if not calls:
+        return []
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(calls)))
+    try:
+        futures = [executor.submit(call) for call in calls]
+        wait(futures, timeout=timeout)
+    finally:
+        # Don't wait for the calls still running after the deadline
+        executor.shutdown(wait=False)
+    results = []
+    for future in futures:
+        if not future.done():
+            future.cancel()
+            results.append(DeadlineExceededError())
+        elif future.exception() is not None:
+            results.append(future.exception())
+        else:
+            results.append(future.result())
+    return results
+
+
+class SingleFlight(object):
+    """
+    Deduplicates concurrent calls: while a call for a key is in progress, other threads calling with the
+    same key wait for it and share its result (or its exception) instead of doing the work again.
+
+    :ivar int calls: number of calls actually executed
+    :ivar int coalesced: number of calls that waited for another call instead
+    """
+
+    class _Call(object):
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Calls ``fn()``, unless a call for ``key`` is already in progress, and returns its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+class AsyncSingleFlight(object):
+    """
+    The asyncio counterpart of :class:`SingleFlight`: concurrent coroutines awaiting the same key share
+    a single task. Calls are deduplicated per event loop.
+
+    :ivar int calls: number of calls actually executed
+    :ivar int coalesced: number of calls that awaited another call instead
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, coroutine_function):
+        """Returns an awaitable on the result of ``coroutine_function()``, unless a call for ``key`` is
+        already in progress, in which case the awaitable is on the result of that call.
+
+        Cancelling one of the callers does not cancel the shared call.
+        """
+        key = (id(asyncio.get_event_loop()), key)
+        future = self._futures.get(key)
+        if future is None:
+            self.calls += 1
+            future = self._futures[key] = asyncio.ensure_future(coroutine_function())
+
+            def forget(f):
+                if self._futures.get(key) is f:
+                    del self._futures[key]
+            future.add_done_callback(forget)
+        else:
+            self.coalesced += 1
+        return asyncio.shield(future)
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+def is_retryable(error):
+    """Whether a request that failed with the given error may succeed if sent again"""
+    if isinstance(error, HTTPError):
+        return error.code >= 500
+    return isinstance(error, (IOError, DeadlineExceededError))
@@ -25,6 +25,11 @@ setup(
         'pyOpenSSL',
         'ndg-httpsclient',
         'pyasn1',
-        'requests >= 2.7'
-    ]
+        'requests >= 2.7',
+        'futures; python_version < "3.0"'
+    ],
+    extras_require={
+        'aio': ['aiohttp >= 3.0'],
+        'msgpack': ['msgpack >= 0.6']
+    }
 )
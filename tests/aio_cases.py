@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the asyncio support of the Prismic library (Python 3.5+), collected by test_aio"""
+
+import asyncio
+import unittest
+
+from prismic import aio
+from prismic.cache import MemoryCache
+from prismic.utils import AsyncSingleFlight
+from .stub_repository import StubRepository, make_document, document_link, API_URL
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncStubRepository(StubRepository):
+    async def __call__(self, full_url, headers=None):
+        await asyncio.sleep(0.01)
+        return StubRepository.__call__(self, full_url, headers)
+
+
+class AsyncSingleFlightTestCase(unittest.TestCase):
+    def test_calls_are_coalesced(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"foo": "bar"}
+
+        async def gather():
+            return await asyncio.gather(*[flight.do("key", fetch) for _ in range(5)])
+
+        results = run(gather())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"foo": "bar"}] * 5)
+        self.assertEqual(flight.coalesced, 4)
+
+
+class AsyncApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repository = AsyncStubRepository(
+            [make_document("doc%02d" % i, uid="uid%02d" % i) for i in range(45)],
+            page_size=10
+        )
+        aio.counts.clear()
+
+    def get_api(self):
+        return aio.get(API_URL, cache=MemoryCache(), request_handler=self.repository)
+
+    def test_get(self):
+        api = run(self.get_api())
+        self.assertIsInstance(api, aio.AsyncApi)
+        self.assertEqual(api.get_master().ref, "master")
+
+    def test_query(self):
+        async def query():
+            api = await self.get_api()
+            return await api.query(aio.predicates.at("document.type", "article"), page_size=5)
+        response = run(query())
+        self.assertEqual(len(response.documents), 5)
+        self.assertEqual(response.total_results_size, 45)
+
+    def test_get_by_id_and_uid(self):
+        async def get():
+            api = await self.get_api()
+            return await asyncio.gather(api.get_by_id("doc03"), api.get_by_uid("article", "uid04"),
+                                        api.get_by_id("missing"))
+        by_id, by_uid, missing = run(get())
+        self.assertEqual(by_id.id, "doc03")
+        self.assertEqual(by_uid.id, "doc04")
+        self.assertIsNone(missing)
+
+    def test_fetch_all_fetches_pages_concurrently(self):
+        async def fetch_all():
+            api = await self.get_api()
+            return await api.fetch_all(aio.predicates.at("document.type", "article"), page_size=10)
+        documents = run(fetch_all())
+        self.assertEqual([doc.id for doc in documents], ["doc%02d" % i for i in range(45)])
+        self.assertEqual(len(self.repository.searches), 5)
+
+    def test_query_many(self):
+        async def query_many():
+            api = await self.get_api()
+            return await api.query_many([
+                {"q": aio.predicates.at("document.id", "doc02")},
+                {"q": aio.predicates.at("document.id", "doc01")}
+            ])
+        responses = run(query_many())
+        self.assertEqual([r.documents[0].id for r in responses], ["doc02", "doc01"])
+
+    def test_query_many_max_concurrency(self):
+        active, peak = [0], [0]
+        repository = self.repository
+
+        async def counting_handler(full_url, headers=None):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            try:
+                return await repository(full_url, headers)
+            finally:
+                active[0] -= 1
+
+        async def query_many():
+            api = await self.get_api()
+            api.request_handler = counting_handler
+            return await api.query_many([{"q": aio.predicates.at("document.id", "doc%02d" % i)} for i in range(6)],
+                                        max_concurrency=2)
+        responses = run(query_many())
+        self.assertEqual([r.documents[0].id for r in responses], ["doc%02d" % i for i in range(6)])
+        self.assertEqual(peak[0], 2)
+
+    def test_resolve_links(self):
+        self.repository.documents.append(make_document("linking", data={"link": tuple(document_link("doc07"))}))
+
+        async def resolve():
+            api = await self.get_api()
+            response = await api.query(aio.predicates.at("document.id", "linking"))
+            return response, await api.resolve_links(response)
+        response, linked = run(resolve())
+        self.assertEqual(list(linked), ["doc07"])
+        self.assertEqual(response.documents[0].get_link("article.link").document.id, "doc07")
+
+    def test_prefetch_links(self):
+        self.repository.documents.append(make_document("linking", data={"link": tuple(document_link("doc07"))}))
+
+        async def prefetch():
+            api = await self.get_api()
+            return await api.prefetch_links([await api.get_by_id("linking")], depth=3)
+        self.assertEqual(list(run(prefetch())), ["linking", "doc07"])
+
+    def test_sync_iterators_not_inherited(self):
+        api = run(self.get_api())
+        for name in ("loader", "query_all", "query_set"):
+            self.assertFalse(hasattr(api, name), name)
+        self.assertFalse(hasattr(api.form("everything"), "iter_documents"))
+
+    def test_scan_page(self):
+        async def scan():
+            api = await self.get_api()
+            documents, after = await api.scan_page(page_size=10)
+            while after is not None:
+                page, after = await api.scan_page(page_size=10, after=after)
+                documents.extend(page)
+            return documents
+        self.assertEqual([doc.id for doc in run(scan())], ["doc%02d" % i for i in range(45)])
+        self.assertEqual(len(self.repository.searches), 5)
+        self.assertIn("after=doc39", self.repository.searches[-1])
+        self.assertFalse(hasattr(aio.AsyncSearchForm, "iter_after"))
+
+    def test_count(self):
+        async def count():
+            api = await self.get_api()
+            return await api.form("everything").ref(api.get_master()).count()
+        self.assertEqual(run(count()), 45)
+
+    def test_count_many(self):
+        async def count_many():
+            api = await self.get_api()
+            first = await api.count_many([
+                {"q": aio.predicates.at("document.id", "doc02")},
+                {"q": aio.predicates.any("document.id", ["doc01", "doc02", "doc03"])}
+            ])
+            return first, await api.count_many([{"q": aio.predicates.at("document.id", "doc02")}])
+        self.assertEqual(run(count_many()), ([1, 3], [1]))
+        self.assertEqual(len(self.repository.searches), 2)
+
+    def test_cache(self):
+        cache = MemoryCache()
+
+        async def query_twice():
+            api = await aio.get(API_URL, cache=cache, request_handler=self.repository)
+            form = api.form("everything").ref(api.get_master())
+            await form.submit()
+            await form.submit()
+
+        self.repository.search_headers = {"Cache-Control": "max-age=60"}
+        run(query_twice())
+        self.assertEqual(len(self.repository.searches), 1)
+
+
+@unittest.skipIf(web is None, "aiohttp is not installed")
+class AiohttpRequestHandlerTestCase(unittest.TestCase):
+    """Runs the default request handler against a local stub server"""
+
+    def setUp(self):
+        self.repository = StubRepository([make_document("doc%02d" % i) for i in range(3)])
+
+    async def serve(self, test):
+        async def handle(request):
+            full_url = str(request.url).replace(
+                "http://%s/" % request.host, "http://stub.prismic.io/", 1)
+            status, text, headers = self.repository(full_url)
+            return web.Response(status=status, text=text, headers=headers, content_type="application/json")
+
+        app = web.Application()
+        app.router.add_route("GET", "/{tail:.*}", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        handler = aio.AiohttpRequestHandler()
+
+        async def request_handler(full_url, headers=None):
+            local_url = full_url.replace("http://stub.prismic.io/", "http://127.0.0.1:%d/" % port, 1)
+            return await handler(local_url, headers)
+
+        try:
+            return await test(request_handler)
+        finally:
+            await handler.close()
+            await runner.cleanup()
+
+    def test_get_and_query(self):
+        async def test(request_handler):
+            api = await aio.get(API_URL, cache=MemoryCache(), request_handler=request_handler)
+            return await api.get_by_id("doc01")
+
+        doc = run(self.serve(test))
+        self.assertEqual(doc.id, "doc01")
+
+
+if __name__ == '__main__':
+    unittest.main()
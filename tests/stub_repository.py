@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A fake Prismic repository answering the requests of the kit, for tests"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import json
+import re
+import threading
+
+from prismic.connection import urlparse
+from prismic.filters import to_millis
+
+API_URL = "http://stub.prismic.io/api"
+SEARCH_URL = "http://stub.prismic.io/api/documents/search"
+
+PREDICATE = re.compile(r"\[:d = ([\w.-]+)\(([\w.-]+), (.*?)\)\]")
+
+
+def make_document(doc_id, doc_type="article", uid=None, tags=None, data=None, last_publication_date=None):
+    fragments = {}
+    for name, (fragment_type, value) in (data or {}).items():
+        fragments[name] = {"type": fragment_type, "value": value}
+    if uid is not None:
+        fragments["uid"] = {"type": "Text", "value": uid}
+    return {
+        "id": doc_id,
+        "uid": uid,
+        "type": doc_type,
+        "href": "%s?ref=master&q=%s" % (SEARCH_URL, doc_id),
+        "tags": tags or [],
+        "slugs": [doc_id.lower()],
+        "last_publication_date": last_publication_date,
+        "data": {doc_type: fragments}
+    }
+
+
+def document_link(doc_id, doc_type="article"):
+    return ["Link.document", {
+        "document": {"id": doc_id, "type": doc_type, "tags": [], "slug": doc_id.lower()},
+        "isBroken": False
+    }]
+
+
+class StubRepository(object):
+    """Serves the api document and the search form over a list of documents, with paging, orderings by
+    document id, ``after``, and the ``at``, ``in`` and ``any`` predicates. Can be used as a request handler.
+    """
+
+    def __init__(self, documents, ref="master", page_size=20):
+        self.documents = list(documents)
+        self.ref = ref
+        self.page_size = page_size
+        self.requests = []
+        self.fail_next = 0
+        self.search_headers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def searches(self):
+        return [url for url in self.requests if url.startswith(SEARCH_URL)]
+
+    def api_data(self):
+        return {
+            "refs": [{"id": "master", "ref": self.ref, "label": "Master", "isMasterRef": True}],
+            "bookmarks": {},
+            "types": {},
+            "tags": [],
+            "forms": {
+                "everything": {
+                    "method": "GET",
+                    "enctype": "application/x-www-form-urlencoded",
+                    "action": SEARCH_URL,
+                    "fields": {
+                        "ref": {"type": "String"},
+                        "q": {"type": "String", "multiple": True},
+                        "page": {"type": "Integer", "default": "1"},
+                        "pageSize": {"type": "Integer", "default": "20"},
+                        "orderings": {"type": "String"},
+                        "after": {"type": "String"},
+                        "fetch": {"type": "String"},
+                        "fetchLinks": {"type": "String"}
+                    }
+                }
+            }
+        }
+
+    def __call__(self, full_url, headers=None):
+        with self._lock:
+            self.requests.append(full_url)
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return 503, "Service Unavailable", {}
+        if full_url.split("?")[0] == API_URL:
+            return 200, json.dumps(self.api_data()), {}
+        return 200, json.dumps(self.search(full_url)), dict(self.search_headers)
+
+    def search(self, full_url):
+        params = {}
+        for key, value in [pair.split("=", 1) for pair in full_url.split("?", 1)[1].split("&")]:
+            params.setdefault(key, []).append(urlparse.unquote_plus(value))
+        documents = self.documents
+        for q in params.get("q", []):
+            for (op, path, args) in PREDICATE.findall(q):
+                documents = [doc for doc in documents if self.matches(doc, op, path, json.loads("[%s]" % args))]
+        if "orderings" in params:
+            documents = sorted(documents, key=lambda doc: doc["id"])
+        if "after" in params:
+            ids = [doc["id"] for doc in documents]
+            after = params["after"][0]
+            documents = documents[ids.index(after) + 1:] if after in ids else []
+        page = int(params.get("page", ["1"])[0])
+        page_size = int(params.get("pageSize", [str(self.page_size)])[0])
+        results = documents[(page - 1) * page_size:page * page_size]
+        total_pages = (len(documents) + page_size - 1) // page_size
+        return {
+            "page": page,
+            "results_per_page": page_size,
+            "results_size": len(results),
+            "total_results_size": len(documents),
+            "total_pages": total_pages,
+            "next_page": "%s?page=%d" % (SEARCH_URL, page + 1) if page < total_pages else None,
+            "prev_page": "%s?page=%d" % (SEARCH_URL, page - 1) if page > 1 else None,
+            "results": results
+        }
+
+    @staticmethod
+    def value(doc, path):
+        if path.startswith("document."):
+            return doc.get(path[len("document."):])
+        fragment = doc["data"][doc["type"]].get(path.split(".")[-1]) if path.startswith("my.%s." % doc["type"]) \
+            else None
+        return fragment["value"] if fragment else None
+
+    def matches(self, doc, op, path, args):
+        value = self.value(doc, path)
+        if op == "at":
+            return value == args[0] or (isinstance(value, list) and args[0] in value)
+        if op == "in":
+            return value in args[0]
+        if op == "any":
+            return value in args[0] or (isinstance(value, list) and bool(set(value) & set(args[0])))
+        if op == "date.after":
+            return value is not None and to_millis(value) > args[0]
+        raise ValueError("Unsupported predicate %s" % op)
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the asyncio support of the Prismic library, which only run on Python 3.5+"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import sys
+
+if sys.version_info >= (3, 5):
+    from .aio_cases import *  # noqa: F401,F403
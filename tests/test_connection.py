@@ -7,6 +7,11 @@ from __future__ import (absolute_import, division, print_function, unicode_liter
 
 import prismic
 from prismic import connection
+from prismic.cache import NoCache, MemoryCache, RefCache
+from prismic.utils import SingleFlight
+from .test_prismic_fixtures import fixture_api
+import threading
+import time
 import unittest
 
 # logging.basicConfig(level=logging.DEBUG)
@@ -25,5 +30,314 @@ class ConnectionTestCase(unittest.TestCase):
         max_age = connection.get_max_age(headers)
         self.assertEqual(max_age, None)
 
+
+class CachePolicyTestCase(unittest.TestCase):
+    def test_max_age(self):
+        self.assertEqual(connection.get_max_age({"Cache-Control": "max-age=30"}), 30)
+        self.assertEqual(connection.get_max_age({"Cache-Control": "public, max-age=30"}), 30)
+
+    def test_s_maxage_takes_precedence(self):
+        policy = connection.CachePolicy.parse({"Cache-Control": "max-age=30, s-maxage=300"})
+        self.assertEqual(policy.ttl, 300)
+
+    def test_age_is_deducted(self):
+        policy = connection.CachePolicy.parse({"Cache-Control": "max-age=30", "Age": "20"})
+        self.assertEqual(policy.ttl, 10)
+        policy = connection.CachePolicy.parse({"Cache-Control": "max-age=30", "Age": "40"})
+        self.assertEqual(policy.ttl, 0)
+
+    def test_expires(self):
+        policy = connection.CachePolicy.parse({
+            "Date": "Wed, 21 Oct 2015 07:28:00 GMT",
+            "Expires": "Wed, 21 Oct 2015 07:29:00 GMT"
+        })
+        self.assertEqual(policy.ttl, 60)
+        self.assertEqual(connection.CachePolicy.parse({"Expires": "0"}).ttl, 0)
+
+    def test_directives(self):
+        policy = connection.CachePolicy.parse({
+            "Cache-Control": "max-age=5, stale-while-revalidate=60, stale-if-error=3600"
+        })
+        self.assertEqual(policy.stale_while_revalidate, 60)
+        self.assertEqual(policy.stale_if_error, 3600)
+        self.assertFalse(policy.no_store)
+        self.assertTrue(connection.CachePolicy.parse({"Cache-Control": "no-store"}).no_store)
+        self.assertTrue(connection.CachePolicy.parse({"Cache-Control": "no-cache"}).no_cache)
+
+    def test_must_revalidate_disables_stale(self):
+        policy = connection.CachePolicy.parse({
+            "Cache-Control": "max-age=5, must-revalidate, stale-while-revalidate=60, stale-if-error=60"
+        })
+        self.assertEqual(policy.stale_while_revalidate, 0)
+        self.assertEqual(policy.stale_if_error, 0)
+
+
+class GetJsonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def request_handler(self, full_url):
+        self.calls.append(full_url)
+        return 200, '{"foo": "bar"}', {"Cache-Control": "max-age=60"}
+
+    def test_no_store(self):
+        cache = MemoryCache()
+        handler = lambda full_url: (200, '{"foo": "bar"}', {"Cache-Control": "no-store, max-age=60"})
+        connection.get_json("https://no-store.prismic.io/api", cache=cache, request_handler=handler)
+        self.assertEqual(len(cache), 0)
+
+    def test_no_store_on_published_ref(self):
+        cache = RefCache(MemoryCache())
+        cache.retain_refs(["master"])
+        handler = lambda full_url: (200, '{"foo": "bar"}', {"Cache-Control": "no-store"})
+        connection.get_json("https://no-store.prismic.io/api/documents/search", {"ref": "master"}, cache=cache,
+                            request_handler=handler)
+        self.assertEqual(len(cache.cache), 0)
+
+    def test_stale_if_error(self):
+        cache = MemoryCache()
+        responses = [
+            (200, '{"foo": "bar"}', {"Cache-Control": "max-age=1, stale-if-error=60"}),
+            (503, "Service Unavailable", {})
+        ]
+        handler = lambda full_url: responses.pop(0)
+        url = "https://stale-if-error.prismic.io/api"
+        connection.get_json(url, cache=cache, request_handler=handler)
+        time.sleep(1.1)
+        self.assertEqual(connection.get_json(url, cache=cache, request_handler=handler), {"foo": "bar"})
+
+    def test_api_ttl_from_server(self):
+        cases = [({"Cache-Control": "max-age=60"}, 60), ({"Expires": "0"}, 0), ({}, prismic.api.API_DEFAULT_TTL)]
+        for headers, ttl in cases:
+            cache = MemoryCache()
+            prismic.get("https://api-ttl.prismic.io/api", cache=cache,
+                        request_handler=lambda full_url: (200, fixture_api, headers))
+            entry = cache.get("https://api-ttl.prismic.io/api")
+            if ttl:
+                self.assertAlmostEqual(entry["expires"] - time.time(), ttl, delta=1)
+            else:
+                self.assertIsNone(entry)
+
+    def test_default_cache_per_repository(self):
+        cache = connection.get_default_cache("https://micro.prismic.io/api")
+        self.assertIs(connection.get_default_cache("https://micro.prismic.io/api/documents/search"), cache)
+        self.assertIsNot(connection.get_default_cache("https://other.prismic.io/api"), cache)
+
+    def test_default_cache_hit(self):
+        url = "https://default-cache.prismic.io/api"
+        first = connection.get_json(url, request_handler=self.request_handler)
+        second = connection.get_json(url, request_handler=self.request_handler)
+        self.assertEqual(first, {"foo": "bar"})
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_get_reuses_default_cache(self):
+        url = "https://default-cache-api.prismic.io/api"
+        handler = lambda full_url: (200, fixture_api, {"Cache-Control": "max-age=5"})
+        api = prismic.get(url, request_handler=handler)
+        self.assertIs(api.cache, connection.get_default_cache(url))
+        self.assertIs(api.form("everything").cache, api.cache)
+
+
+class StaleWhileRevalidateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.responses = [(200, '{"version": 1}', {}), (200, '{"version": 2}', {})]
+        self.url = "https://stale.prismic.io/api"
+        self.cache = MemoryCache()
+
+    def request_handler(self, full_url):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def get_json(self, max_stale):
+        return connection.get_json(self.url, cache=self.cache, ttl=1, request_handler=self.request_handler,
+                                   max_stale=max_stale)
+
+    def wait_for_revalidation(self):
+        for _ in range(100):
+            if not connection._revalidating:
+                return
+            time.sleep(0.01)
+
+    def test_expired_response_is_refetched(self):
+        self.assertEqual(self.get_json(0)["version"], 1)
+        time.sleep(1.1)
+        self.assertEqual(self.get_json(0)["version"], 2)
+
+    def test_stale_response_is_served_and_refreshed(self):
+        self.assertEqual(self.get_json(10)["version"], 1)
+        time.sleep(1.1)
+        self.assertEqual(self.get_json(10)["version"], 1)
+        self.wait_for_revalidation()
+        self.assertEqual(self.get_json(10)["version"], 2)
+
+    def test_stale_response_is_served_when_refresh_fails(self):
+        self.responses[1] = IOError("Connection refused")
+        self.assertEqual(self.get_json(10)["version"], 1)
+        time.sleep(1.1)
+        self.assertEqual(self.get_json(10)["version"], 1)
+        self.wait_for_revalidation()
+        self.assertEqual(self.get_json(10)["version"], 1)
+
+
+class ConditionalRequestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.url = "https://conditional.prismic.io/api"
+        self.cache = MemoryCache()
+        self.requests = []
+
+    def request_handler(self, full_url, headers=None):
+        self.requests.append(headers)
+        if headers and headers.get("If-None-Match") == '"v1"':
+            return 304, "", {"Cache-Control": "max-age=1"}
+        return 200, '{"version": 1}', {"Cache-Control": "max-age=1", "etag": '"v1"'}
+
+    def get_json(self, request_handler=None):
+        return connection.get_json(self.url, cache=self.cache, request_handler=request_handler or self.request_handler)
+
+    def test_not_modified_extends_entry(self):
+        first = self.get_json()
+        time.sleep(1.1)
+        second = self.get_json()
+        self.assertIs(second, first)
+        self.assertEqual(self.requests, [None, {"If-None-Match": '"v1"'}])
+        self.assertEqual(self.get_json(), first)
+        self.assertEqual(len(self.requests), 2)
+
+    def test_not_modified_without_caching_headers_keeps_lifetime(self):
+        def request_handler(full_url, headers=None):
+            self.requests.append(headers)
+            if headers:
+                return 304, "", {}
+            return 200, '{"version": 1}', {"Cache-Control": "max-age=1", "ETag": '"v1"'}
+
+        self.get_json(request_handler)
+        time.sleep(1.1)
+        for _ in range(3):
+            self.assertEqual(self.get_json(request_handler)["version"], 1)
+        self.assertEqual(self.requests, [None, {"If-None-Match": '"v1"'}])
+
+    def test_handler_without_headers_argument(self):
+        calls = []
+
+        def legacy_handler(full_url):
+            calls.append(full_url)
+            return 200, '{"version": 1}', {"Cache-Control": "max-age=1", "ETag": '"v1"'}
+
+        self.get_json(legacy_handler)
+        time.sleep(1.1)
+        self.assertEqual(self.get_json(legacy_handler), {"version": 1})
+        self.assertEqual(len(calls), 2)
+
+    def test_get_header(self):
+        self.assertEqual(connection.get_header({"etag": "x"}, "ETag"), "x")
+        self.assertIsNone(connection.get_header({}, "ETag"))
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def test_concurrent_get_json_are_coalesced(self):
+        calls = []
+
+        def slow_handler(full_url):
+            calls.append(full_url)
+            time.sleep(0.2)
+            return 200, '{"foo": "bar"}', {}
+
+        before = connection.inflight_requests.coalesced
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(connection.get_json(
+            "https://coalesce.prismic.io/api", cache=NoCache(), request_handler=slow_handler
+        ))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(connection.inflight_requests.coalesced - before, 4)
+
+    def test_reset_forgets_fetches_in_progress(self):
+        url = "https://forked.prismic.io/api"
+        started, release = threading.Event(), threading.Event()
+
+        def blocked_handler(full_url):
+            started.set()
+            release.wait(5)
+            return 200, '{"from": "parent"}', {}
+
+        parent = threading.Thread(target=connection.get_json, args=(url,),
+                                  kwargs={"cache": NoCache(), "request_handler": blocked_handler})
+        parent.start()
+        try:
+            started.wait(5)
+            connection.reset_session()  # as done in a forked child, where the parent thread doesn't exist
+            results = []
+            child = threading.Thread(target=lambda: results.append(connection.get_json(
+                url, cache=NoCache(), request_handler=lambda full_url: (200, '{"from": "child"}', {})
+            )))
+            child.start()
+            child.join(2)
+            self.assertEqual(results, [{"from": "child"}])
+        finally:
+            release.set()
+            parent.join()
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError("boom")
+
+        def call():
+            try:
+                flight.do("key", fail)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(flight.stats(), {"calls": 1, "coalesced": 1})
+
+
+class SessionRequestHandlerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.handler = connection.SessionRequestHandler(pool_maxsize=4)
+
+    def test_session_is_reused(self):
+        session = self.handler.session
+        self.assertIs(self.handler.session, session)
+        self.assertEqual(session.get_adapter("https://micro.prismic.io/api")._pool_maxsize, 4)
+
+    def test_reset(self):
+        session = self.handler.session
+        self.handler.reset()
+        self.assertIsNot(self.handler.session, session)
+
+    def test_new_session_after_fork(self):
+        session = self.handler.session
+        self.handler._pid = -1  # as seen from a forked child
+        self.assertIsNot(self.handler.session, session)
+
+    def test_reset_after_fork_with_lock_held(self):
+        session = self.handler.session
+        self.handler._lock.acquire()  # held by another thread of the parent at the time of the fork
+        self.handler._pid = -1
+        self.handler.reset()
+        self.assertIsNot(self.handler.session, session)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the export of the documents of a ref"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import prismic
+from prismic import export, predicates
+from prismic.cache import NoCache
+from prismic.exceptions import HTTPError
+from .stub_repository import StubRepository, make_document, API_URL
+
+
+class ExporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repository = StubRepository(
+            [make_document("doc%02d" % i, tags=["é"]) for i in range(45)],
+            page_size=10
+        )
+        self.api = prismic.get(API_URL, cache=NoCache(), request_handler=self.repository)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "export.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_export(self):
+        self.assertEqual(self.api.exporter(page_size=10).export(self.path), 45)
+        documents = list(export.read_export(self.path))
+        self.assertEqual([doc["id"] for doc in documents], ["doc%02d" % i for i in range(45)])
+        self.assertEqual(documents[0]["tags"], ["é"])
+        self.assertFalse(os.path.exists(self.path + export.CHECKPOINT_SUFFIX))
+
+    def test_query(self):
+        exporter = self.api.exporter(predicates.any("document.id", ["doc01", "doc02"]))
+        self.assertEqual(exporter.export(self.path), 2)
+
+    def test_write(self):
+        stream = io.BytesIO()
+        self.assertEqual(self.api.exporter(page_size=10, workers=1).write(stream), 45)
+        lines = stream.getvalue().decode("utf-8").splitlines()
+        self.assertEqual(json.loads(lines[-1])["id"], "doc44")
+
+    def test_failed_pages_are_retried(self):
+        self.repository.fail_next = 2
+        self.assertEqual(self.api.exporter(page_size=10, workers=1).export(self.path), 45)
+
+    def test_resume(self):
+        exporter = self.api.exporter(page_size=10, workers=1, retries=0)
+        original = self.repository.search
+
+        def search(full_url):
+            if "page=4" in full_url:
+                raise HTTPError(500, "Internal Server Error")
+            return original(full_url)
+
+        self.repository.search = search
+        self.assertRaises(HTTPError, exporter.export, self.path)
+        self.assertEqual(len(list(export.read_export(self.path))), 30)
+
+        self.repository.search = original
+        del self.repository.requests[:]
+        self.assertEqual(exporter.export(self.path, resume=True), 45)
+        self.assertEqual([doc["id"] for doc in export.read_export(self.path)], ["doc%02d" % i for i in range(45)])
+        self.assertEqual(len(self.repository.searches), 2)
+
+    def test_resume_another_query(self):
+        with io.open(self.path + export.CHECKPOINT_SUFFIX, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"ref": "master", "q": None, "page_size": 20, "format": "jsonl",
+                                "page": 1, "offset": 0, "documents": 0}))
+        self.assertRaises(ValueError, self.api.exporter(page_size=10).export, self.path, True)
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, self.api.exporter, format="xml")
+
+    @unittest.skipIf(export.msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        self.assertEqual(self.api.exporter(page_size=10, format="msgpack").export(self.path), 45)
+        documents = list(export.read_export(self.path, "msgpack"))
+        self.assertEqual([doc["id"] for doc in documents], ["doc%02d" % i for i in range(45)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the local evaluation of queries"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import prismic
+from prismic import filters, predicates
+from prismic.cache import NoCache
+from prismic.indexes import SortedIndex
+from prismic.local import LocalRepository
+from .stub_repository import StubRepository, make_document, document_link, API_URL
+
+
+def paragraph(text):
+    return [{"type": "paragraph", "text": text, "spans": []}]
+
+
+DOCUMENTS = [
+    make_document("p1", "product", uid="macaron", tags=["sweet", "french"],
+                  last_publication_date="2017-01-13T11:45:21+0000", data={
+                      "name": ("StructuredText", paragraph("Speculoos macaron")),
+                      "price": ("Number", 2.5),
+                      "release": ("Date", "2016-03-14"),
+                      "shop": ("GeoPoint", {"latitude": 48.8583, "longitude": 2.2944}),
+                      "author": ("Link.document", document_link("a1", "author")[1]),
+                      "flavours": ("Group", [{"name": {"type": "Text", "value": "vanilla"}},
+                                             {"name": {"type": "Text", "value": "chocolate"}}])
+                  }),
+    make_document("p2", "product", uid="cupcake", tags=["sweet"],
+                  last_publication_date="2017-01-14T09:00:00+0100", data={
+                      "name": ("StructuredText", paragraph("Chocolate cupcake")),
+                      "price": ("Number", 4),
+                      "release": ("Date", "2016-07-01"),
+                      "shop": ("GeoPoint", {"latitude": 51.5007, "longitude": -0.1246})
+                  }),
+    make_document("p3", "product", uid="tart", tags=["salty"], data={
+        "name": ("StructuredText", paragraph("Onion tart"))
+    }),
+    make_document("a1", "author", uid="john", data={"name": ("Text", "John Doe")})
+]
+
+
+class FiltersTestCase(unittest.TestCase):
+    def select(self, *q):
+        return [doc["id"] for doc in DOCUMENTS if filters.matches(doc, *q)]
+
+    def test_at_any_in(self):
+        self.assertEqual(self.select(predicates.at("document.type", "product")), ["p1", "p2", "p3"])
+        self.assertEqual(self.select(predicates.at("document.tags", ["sweet", "french"])), ["p1"])
+        self.assertEqual(self.select(predicates.not_("document.tags", "sweet")), ["p3", "a1"])
+        self.assertEqual(self.select(predicates.any("document.tags", ["french", "salty"])), ["p1", "p3"])
+        self.assertEqual(self.select(predicates.in_("my.product.uid", ["tart", "cupcake"])), ["p2", "p3"])
+        self.assertEqual(self.select(predicates.at("my.product.author", "a1")), ["p1"])
+        self.assertEqual(self.select(predicates.at("my.product.flavours.name", "chocolate")), ["p1"])
+
+    def test_several_predicates(self):
+        self.assertEqual(self.select(predicates.at("document.type", "product"),
+                                     predicates.at("document.tags", "sweet"),
+                                     predicates.gt("my.product.price", 3)), ["p2"])
+
+    def test_fulltext(self):
+        self.assertEqual(self.select(predicates.fulltext("document", "chocolate")), ["p1", "p2"])
+        self.assertEqual(self.select(predicates.fulltext("my.product.name", "chocolate")), ["p2"])
+        self.assertEqual(self.select(predicates.fulltext("document", "john doe")), ["a1"])
+
+    def test_numbers(self):
+        self.assertEqual(self.select(predicates.gt("my.product.price", 2.5)), ["p2"])
+        self.assertEqual(self.select(predicates.lt("my.product.price", 4)), ["p1"])
+        self.assertEqual(self.select(predicates.in_range("my.product.price", 2.5, 4)), ["p1", "p2"])
+
+    def test_dates(self):
+        self.assertEqual(self.select(predicates.date_after("my.product.release", datetime.datetime(2016, 5, 1))),
+                         ["p2"])
+        self.assertEqual(self.select(predicates.date_before("my.product.release", "2016-05-01")), ["p1"])
+        self.assertEqual(self.select(predicates.date_between("my.product.release", "2016-01-01", "2016-12-31")),
+                         ["p1", "p2"])
+        self.assertEqual(self.select(predicates.month("my.product.release", "July")), ["p2"])
+        self.assertEqual(self.select(predicates.day_of_week("my.product.release", "monday")), ["p1"])
+        self.assertEqual(self.select(predicates.year("my.product.release", 2016)), ["p1", "p2"])
+        self.assertEqual(self.select(predicates.hour("document.last_publication_date", 8)), ["p2"])
+        self.assertEqual(self.select(predicates.day_of_month_after("my.product.release", 10)), ["p1"])
+
+    def test_near(self):
+        self.assertEqual(self.select(predicates.near("my.product.shop", 48.86, 2.35, 10)), ["p1"])
+        self.assertEqual(self.select(predicates.near("my.product.shop", 48.86, 2.35, 400)), ["p1", "p2"])
+
+    def test_unsupported_predicate(self):
+        self.assertRaises(ValueError, self.select, predicates.similar("p1", 10))
+
+    def test_compile(self):
+        test = filters.compile(predicates.at("document.type", "product"), predicates.any("document.tags", ["salty"]))
+        self.assertEqual([doc["id"] for doc in DOCUMENTS if test(doc)], ["p3"])
+        self.assertTrue(filters.compile()(DOCUMENTS[0]))
+        test = filters.compile(predicates.any("my.product.shop", [{"latitude": 48.8583, "longitude": 2.2944}]))
+        self.assertEqual([doc["id"] for doc in DOCUMENTS if test(doc)], ["p1"])
+        self.assertRaises(ValueError, filters.compile, predicates.similar("p1", 10))
+
+    def test_to_millis(self):
+        self.assertEqual(filters.to_millis("1970-01-02"), 86400000)
+        self.assertEqual(filters.to_millis("1970-01-01T01:00:00+0100"), 0)
+        self.assertEqual(filters.to_millis(datetime.datetime(1970, 1, 1, 0, 0, 1)), 1000)
+        self.assertIsNone(filters.to_millis("tomorrow"))
+
+    def test_sort(self):
+        self.assertEqual([doc["id"] for doc in filters.sort(DOCUMENTS, "[my.product.price desc]")],
+                         ["p2", "p1", "p3", "a1"])
+        self.assertEqual([doc["id"] for doc in filters.sort(DOCUMENTS, "[document.type, document.id desc]")],
+                         ["a1", "p3", "p2", "p1"])
+        self.assertEqual([doc["id"] for doc in filters.sort(DOCUMENTS, "[document.last_publication_date desc]")],
+                         ["p2", "p1", "p3", "a1"])
+
+
+class LocalRepositoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.local = LocalRepository(DOCUMENTS)
+
+    def test_lookups(self):
+        self.assertEqual(self.local.get_by_uid("product", "tart").id, "p3")
+        self.assertEqual(self.local.get_by_id("a1").uid, "john")
+        self.assertIsNone(self.local.get_by_uid("author", "tart"))
+        self.assertEqual(self.local.get_single("author").id, "a1")
+        response = self.local.get_by_ids(["p2", "x", "p1"])
+        self.assertEqual([doc.id for doc in response.documents], ["p2", "p1"])
+        self.assertEqual(response.missing_ids, ["x"])
+
+    def test_query(self):
+        response = self.local.query(predicates.at("document.type", "product"), page_size=2, page=2,
+                                    orderings="[my.product.price desc]")
+        self.assertEqual([doc.id for doc in response.documents], ["p3"])
+        self.assertEqual((response.total_results_size, response.total_pages), (3, 2))
+        response = self.local.query([predicates.at("document.type", "product")], after="p1")
+        self.assertEqual([doc.id for doc in response.documents], ["p2", "p3"])
+        self.assertEqual(len(self.local.query().documents), 4)
+        self.assertRaises(ValueError, self.local.query, "[[:d = at(document.type, \"product\")]]")
+
+    def test_add_and_remove(self):
+        self.local.add(make_document("p3", "product", uid="pie"))
+        self.assertIsNone(self.local.get_by_uid("product", "tart"))
+        self.assertEqual(self.local.get_by_uid("product", "pie").id, "p3")
+        self.assertTrue(self.local.remove("p3"))
+        self.assertFalse(self.local.remove("p3"))
+        self.assertEqual(len(self.local), 3)
+        self.assertNotIn("p3", self.local)
+
+
+class IndexesTestCase(unittest.TestCase):
+    QUERIES = [
+        [predicates.at("document.type", "product")],
+        [predicates.at("document.tags", ["sweet", "french"])],
+        [predicates.any("document.tags", ["french", "salty"]), predicates.at("document.type", "product")],
+        [predicates.in_("document.id", ["p3", "a1", "x"])],
+        [predicates.at("document.id", "p2")],
+        [predicates.in_("my.product.uid", ["tart", "cupcake"])],
+        [predicates.gt("my.product.price", 2.5)],
+        [predicates.lt("my.product.price", 4)],
+        [predicates.in_range("my.product.price", 2.5, 4), predicates.at("document.tags", "sweet")],
+        [predicates.date_after("my.product.release", "2016-05-01")],
+        [predicates.date_before("my.product.release", datetime.datetime(2016, 5, 1))],
+        [predicates.date_between("my.product.release", "2016-01-01", "2016-07-01")],
+        [predicates.gt("my.product.release", 0)],
+        [predicates.month("my.product.release", "july"), predicates.at("document.type", "product")]
+    ]
+
+    def setUp(self):
+        self.local = LocalRepository(DOCUMENTS)
+        self.local.create_index("my.product.price", "sorted")
+        self.local.create_index("my.product.release", "sorted")
+        self.local.create_index("my.product.uid")
+
+    def test_same_results_as_a_scan(self):
+        for q in self.QUERIES:
+            expected = [doc["id"] for doc in DOCUMENTS if filters.matches(doc, *q)]
+            self.assertEqual([doc.id for doc in self.local.query(q).documents], expected, q)
+
+    def test_index_lookups(self):
+        index = self.local.create_index("my.product.price", "sorted")
+        self.assertEqual(index.lookup(predicates.gt("my.product.price", 2)), {"p1", "p2"})
+        self.assertEqual(index.lookup(predicates.in_range("my.product.price", 4, 10)), {"p2"})
+        self.assertIsNone(index.lookup(predicates.gt("my.product.weight", 2)))
+        self.assertIsNone(index.lookup(predicates.at("my.product.price", 4)))
+
+    def test_bulk_build_same_as_inserts(self):
+        documents = [make_document("d%d" % i, "product", data={"price": ("Number", i % 7)}) for i in range(50)]
+        built, inserted = SortedIndex("my.product.price"), SortedIndex("my.product.price")
+        built.add_all(documents[:20])
+        built.add_all(documents[20:])
+        for document in documents:
+            inserted.add(document)
+        self.assertEqual((built._keys, built._ids, built._numbers),
+                         (inserted._keys, inserted._ids, inserted._numbers))
+
+    def test_updates(self):
+        self.local.add(make_document("p4", "product", tags=["french"], data={"price": ("Number", 3)}))
+        self.local.add(make_document("p1", "product", tags=["salty"], data={"price": ("Number", 10)}))
+        self.local.remove("p2")
+        q = [predicates.in_range("my.product.price", 2, 5)]
+        self.assertEqual([doc.id for doc in self.local.query(q).documents], ["p4"])
+        q = [predicates.at("document.tags", "salty")]
+        self.assertEqual([doc.id for doc in self.local.query(q).documents], ["p3", "p1"])
+        self.assertEqual(self.local.query(predicates.at("document.tags", "sweet")).documents, [])
+
+    def test_unknown_kind(self):
+        self.assertRaises(ValueError, self.local.create_index, "my.product.price", "btree")
+
+
+class LoadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repository = StubRepository(DOCUMENTS, page_size=2)
+        self.api = prismic.get(API_URL, cache=NoCache(), request_handler=self.repository)
+
+    def test_from_api(self):
+        local = LocalRepository.from_api(self.api, page_size=2)
+        self.assertEqual(len(local), 4)
+        self.assertEqual(local.ref, "master")
+        self.assertEqual(local.get_by_uid("product", "cupcake").id, "p2")
+
+    def test_from_export(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "export.jsonl")
+            self.api.exporter(page_size=2).export(path)
+            local = LocalRepository.from_export(path)
+            self.assertEqual([doc["id"] for doc in local], ["p1", "p2", "p3", "a1"])
+        finally:
+            shutil.rmtree(directory)
+
+
+class SyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repository = StubRepository([
+            make_document("doc%02d" % i, last_publication_date="2017-01-%02dT10:00:00+0000" % (i + 1))
+            for i in range(20)
+        ], ref="ref1", page_size=5)
+        api = prismic.get(API_URL, cache=NoCache(), request_handler=self.repository)
+        self.local = LocalRepository.from_api(api, page_size=5)
+
+    def publish(self):
+        self.repository.ref = "ref2"
+        self.repository.documents[3] = make_document("doc03", tags=["updated"],
+                                                     last_publication_date="2017-02-01T10:00:00+0000")
+        self.repository.documents.append(make_document("doc20", last_publication_date="2017-02-02T10:00:00+0000"))
+        del self.repository.requests[:]
+        return prismic.get(API_URL, cache=NoCache(), request_handler=self.repository)
+
+    def test_updated_documents(self):
+        changes = self.local.sync(self.publish(), page_size=5)
+        self.assertEqual(changes.ref, "ref2")
+        self.assertEqual(sorted(changes.updated), ["doc03", "doc19", "doc20"])
+        self.assertEqual(changes.deleted, [])
+        self.assertEqual(self.local.ref, "ref2")
+        self.assertEqual(len(self.local), 21)
+        self.assertEqual(self.local.get_by_id("doc03").tags, ["updated"])
+        self.assertEqual(len(self.repository.searches), 2)
+
+    def test_deleted_documents(self):
+        api = self.publish()
+        del self.repository.documents[5]
+        changes = self.local.sync(api, page_size=5)
+        self.assertEqual(changes.deleted, ["doc05"])
+        self.assertNotIn("doc05", self.local)
+        self.assertEqual(len(self.local), 20)
+
+    def test_same_ref(self):
+        changes = self.local.sync(prismic.get(API_URL, cache=NoCache(), request_handler=self.repository))
+        self.assertEqual(changes.updated, [])
+        self.assertEqual(len(self.repository.searches), 4)
+
+    def test_query_scope(self):
+        for i, document in enumerate(self.repository.documents):
+            document["tags"] = ["sweet"] if i % 2 else []
+        sweet = predicates.at("document.tags", "sweet")
+        local = LocalRepository.from_api(prismic.get(API_URL, cache=NoCache(), request_handler=self.repository),
+                                         q=sweet, page_size=5)
+        self.assertEqual(len(local), 10)
+        api = self.publish()  # doc03 loses its tag, doc20 has none
+        self.repository.documents.append(make_document("doc21", tags=["sweet"],
+                                                       last_publication_date="2017-02-03T10:00:00+0000"))
+        changes = local.sync(api, page_size=5)
+        self.assertEqual(sorted(changes.updated), ["doc19", "doc21"])
+        self.assertEqual(changes.deleted, ["doc03"])
+        self.assertEqual(sorted(doc["id"] for doc in local), ["doc01"] + ["doc%02d" % i for i in range(5, 22, 2)])
+        self.assertTrue(all("tags" in url for url in self.repository.searches))
+
+    def test_without_publication_dates(self):
+        local = LocalRepository([make_document("doc99")], ref="ref0")
+        changes = local.sync(self.publish(), page_size=5)
+        self.assertEqual(len(changes.updated), 21)
+        self.assertEqual(changes.deleted, ["doc99"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,11 +5,15 @@
 
 from __future__ import (absolute_import, division, print_function, unicode_literals)
 
-from prismic.cache import ShelveCache
+from prismic.cache import ShelveCache, MemoryCache, SQLiteCache, RefCache
 from prismic.exceptions import InvalidTokenError, AuthorizationNeededError, InvalidURLError
 from .test_prismic_fixtures import fixture_api, fixture_search, fixture_groups, \
     fixture_structured_lists, fixture_empty_paragraph, fixture_store_geopoint, fixture_image_links, \
     fixture_spans_labels, fixture_block_labels, fixture_custom_html, fixture_slices, fixture_composite_slices
+import os
+import shutil
+import tempfile
+import threading
 import time
 import json
 import logging
@@ -541,5 +545,186 @@ class TestCache(unittest.TestCase):
         self.assertIsNone(self.cache.get("toto"))
 
 
+class TestMemoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = MemoryCache()
+
+    def test_set_get(self):
+        self.cache.set("foo", "bar", 3600)
+        self.assertEqual(self.cache.get("foo"), "bar")
+
+    def test_no_expiration(self):
+        self.cache.set("foo", "bar", 0)
+        self.assertEqual(self.cache.get("foo"), "bar")
+
+    def test_expiration(self):
+        self.cache.set("toto", "tata", 1)
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get("toto"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_delete(self):
+        self.cache.set("foo", "bar", 3600)
+        self.cache.delete("foo")
+        self.assertIsNone(self.cache.get("foo"))
+
+    def test_max_entries_evicts_least_recently_used(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_max_bytes(self):
+        cache = MemoryCache(max_bytes=100, sizeof=len)
+        cache.set("a", "x" * 60)
+        cache.set("b", "y" * 60)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.bytes, 60)
+        cache.set("c", "z" * 200)
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.rejections, 1)
+        self.assertEqual(cache.get("b"), "y" * 60)
+
+    def test_tinylfu_protects_frequent_entries(self):
+        cache = MemoryCache(max_entries=1, policy="tinylfu")
+        cache.set("hot", 1)
+        for _ in range(3):
+            cache.get("hot")
+        cache.set("cold", 2)
+        self.assertEqual(cache.get("hot"), 1)
+        self.assertIsNone(cache.get("cold"))
+
+    def test_stats(self):
+        self.cache.set("foo", "bar")
+        self.cache.get("foo")
+        self.cache.get("missing")
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            MemoryCache(policy="fifo")
+
+
+class TestRefCache(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MemoryCache()
+        self.cache = RefCache(self.backend)
+        self.cache.retain_refs(["master1", "release1"])
+        self.url = "https://micro.prismic.io/api/documents/search?ref=%s&q=%%5B%%5D"
+
+    def test_published_ref_is_immutable(self):
+        self.cache.set(self.url % "master1", "result", 1)
+        time.sleep(1.1)
+        self.assertEqual(self.cache.get(self.url % "master1"), "result")
+
+    def test_other_keys_use_ttl(self):
+        self.assertFalse(self.cache.is_immutable(self.url % "preview"))
+        self.assertFalse(self.cache.is_immutable("https://micro.prismic.io/api"))
+        self.cache.set(self.url % "preview", "result", 1)
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get(self.url % "preview"))
+
+    def test_superseded_ref_is_dropped(self):
+        self.cache.set(self.url % "master1", "old", 60)
+        self.cache.set(self.url % "release1", "release", 60)
+        self.cache.retain_refs(["master2", "release1"])
+        self.assertIsNone(self.backend.get(self.url % "master1"))
+        self.assertEqual(self.cache.get(self.url % "release1"), "release")
+        self.assertTrue(self.cache.is_immutable(self.url % "master2"))
+
+    def test_tracked_keys_are_bounded(self):
+        cache = RefCache(self.backend, max_keys=2)
+        cache.retain_refs(["master1"])
+        for q in ("a", "b", "c"):
+            cache.set(self.url % "master1" + q, q, 60)
+        self.assertEqual(list(cache._keys_by_ref["master1"]), [self.url % "master1" + q for q in ("b", "c")])
+        self.assertIsNone(self.backend.get(self.url % "master1" + "a"))
+        self.assertEqual(self.backend.get(self.url % "master1" + "c"), "c")
+
+    def test_ref_of(self):
+        self.assertEqual(RefCache.ref_of("http://x/api?page=1&ref=a%2Bb"), "a+b")
+        self.assertIsNone(RefCache.ref_of("http://x/api?preref=a"))
+
+    def test_api_declares_refs(self):
+        cache = RefCache()
+        api = prismic.Api(json.loads(fixture_api), None, cache, None)
+        self.assertTrue(cache.is_immutable(self.url % api.get_master().ref))
+
+
+class TestSQLiteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.sqlite")
+        self.cache = SQLiteCache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_set_get(self):
+        self.cache.set("foo", {"bar": [1, 2]}, 3600)
+        self.assertEqual(self.cache.get("foo"), {"bar": [1, 2]})
+
+    def test_no_expiration(self):
+        self.cache.set("foo", "bar", 0)
+        self.assertEqual(self.cache.get("foo"), "bar")
+
+    def test_expiration(self):
+        self.cache.set("toto", "tata", 1)
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get("toto"))
+
+    def test_purge(self):
+        self.cache.set("toto", "tata", 1)
+        self.cache.set("foo", "bar", 3600)
+        time.sleep(1.1)
+        self.cache.purge()
+        self.assertEqual(len(self.cache), 1)
+
+    def test_max_bytes(self):
+        cache = SQLiteCache(self.path, max_bytes=1000)
+        for i in range(10):
+            cache.set("key%d" % i, "x" * 200)
+        cache.purge()
+        self.assertLessEqual(len(cache), 5)
+        self.assertEqual(cache.get("key9"), "x" * 200)
+
+    def test_values_stored_as_json(self):
+        self.cache.set("foo", {"b": 1, "a": [None, True]}, 3600)
+        raw = self.cache.db.execute("SELECT value FROM cache WHERE key = 'foo'").fetchone()[0]
+        self.assertEqual(json.loads(raw), {"b": 1, "a": [None, True]})
+        self.assertEqual(list(self.cache.get("foo").keys()), ["b", "a"])
+
+    def test_private_directory(self):
+        cache = SQLiteCache(os.path.join(self.directory, "private", "cache.sqlite"))
+        cache.set("foo", "bar")
+        self.assertEqual(os.stat(os.path.join(self.directory, "private")).st_mode & 0o777, 0o700)
+
+    def test_shared_between_instances(self):
+        SQLiteCache(self.path).set("foo", "bar", 3600)
+        self.assertEqual(self.cache.get("foo"), "bar")
+
+    def test_threads(self):
+        def work(n):
+            for i in range(20):
+                self.cache.set("key%d-%d" % (n, i), i, 3600)
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.cache), 80)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the query helpers of the Api, against a stub repository"""
+
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import threading
+import time
+import unittest
+
+import prismic
+from prismic import predicates
+from prismic.cache import NoCache
+from prismic.exceptions import HTTPError, DeadlineExceededError
+from prismic.loader import url_safe_chunks
+from prismic.links import document_links
+from prismic.queryset import plan_pages
+from .stub_repository import StubRepository, make_document, document_link, API_URL
+
+
+class StubRepositoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repository = StubRepository(
+            [make_document("doc%02d" % i, uid="uid%02d" % i) for i in range(45)],
+            page_size=10
+        )
+        self.api = prismic.get(API_URL, cache=NoCache(), request_handler=self.repository)
+        prismic.api.counts.clear()
+
+
+class QueryManyTestCase(StubRepositoryTestCase):
+    def test_results_in_order(self):
+        responses = self.api.query_many([
+            {"q": predicates.at("document.id", "doc03")},
+            {"q": predicates.at("document.id", "doc01")},
+            self.api.form("everything").ref(self.api.get_master()).query(predicates.at("document.id", "doc02"))
+        ])
+        self.assertEqual([r.documents[0].id for r in responses], ["doc03", "doc01", "doc02"])
+
+    def test_errors_per_query(self):
+        self.repository.fail_next = 1
+        responses = self.api.query_many([{"q": predicates.at("document.id", "doc03")}], max_workers=1)
+        self.assertIsInstance(responses[0], HTTPError)
+
+    def test_deadline(self):
+        slow = self.repository
+
+        def slow_handler(full_url):
+            time.sleep(0.5)
+            return slow(full_url)
+
+        self.api.request_handler = slow_handler
+        responses = self.api.query_many([{"q": predicates.at("document.id", "doc04")}], timeout=0.05)
+        self.assertIsInstance(responses[0], DeadlineExceededError)
+
+
+class GetByIdsTestCase(StubRepositoryTestCase):
+    def test_order_and_missing_ids(self):
+        response = self.api.get_by_ids(["doc07", "missing", "doc02", "doc07"])
+        self.assertEqual([doc.id for doc in response.documents], ["doc07", "doc02"])
+        self.assertEqual(list(response.by_id.keys()), ["doc07", "missing", "doc02"])
+        self.assertIsNone(response.by_id["missing"])
+        self.assertEqual(response.missing_ids, ["missing"])
+        self.assertEqual(response.total_results_size, 2)
+
+    def test_chunks(self):
+        ids = ["doc%02d" % i for i in reversed(range(45))]
+        response = self.api.get_by_ids(ids)
+        self.assertEqual([doc.id for doc in response.documents], ids)
+        self.assertEqual(len(self.repository.searches), 1)
+
+    def test_url_safe_chunks(self):
+        chunks = url_safe_chunks(["x" * 100] * 50)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 50)
+        self.assertEqual(len(url_safe_chunks(["id"] * 250)), 3)
+
+    def test_paginated_query(self):
+        response = self.api.get_by_ids(["doc%02d" % i for i in range(45)], page_size=10, page=2)
+        self.assertEqual(len(response.documents), 10)
+        self.assertEqual(response.total_results_size, 45)
+
+
+class QueryAllTestCase(StubRepositoryTestCase):
+    def test_all_pages(self):
+        documents = list(self.api.query_all(predicates.at("document.type", "article"), page_size=10))
+        self.assertEqual([doc.id for doc in documents], ["doc%02d" % i for i in range(45)])
+        self.assertEqual(len(self.repository.searches), 5)
+
+    def test_without_prefetch(self):
+        form = self.api.form("everything").ref(self.api.get_master()).page_size(20)
+        iterator = form.iter_documents(prefetch=0)
+        next(iterator)
+        self.assertEqual(len(self.repository.searches), 1)
+        self.assertEqual(len(list(iterator)), 44)
+        self.assertEqual(len(self.repository.searches), 3)
+
+    def test_next_pages_are_prefetched(self):
+        prefetched = threading.Event()
+        repository = self.repository
+
+        def request_handler(full_url, headers=None):
+            result = repository(full_url, headers)
+            if len(repository.searches) == 3:
+                prefetched.set()
+            return result
+
+        self.api.request_handler = request_handler
+        form = self.api.form("everything").ref(self.api.get_master()).page_size(10)
+        iterator = form.iter_documents(prefetch=2)
+        next(iterator)
+        self.assertTrue(prefetched.wait(5))
+        self.assertEqual(len(self.repository.searches), 3)
+        iterator.close()
+
+    def test_starts_from_current_page(self):
+        form = self.api.form("everything").ref(self.api.get_master()).page_size(10).page(4)
+        self.assertEqual(len(list(form.iter_documents())), 15)
+
+
+class CountTestCase(StubRepositoryTestCase):
+    def setUp(self):
+        super(CountTestCase, self).setUp()
+        self.form = self.api.form("everything").ref(self.api.get_master())
+
+    def test_count_only_requests_one_result(self):
+        form = self.form.page_size(20).page(2).orderings("[document.id]").fetch("article.title")
+        self.assertEqual(form.count(), 45)
+        self.assertIn("pageSize=1", self.repository.searches[0])
+        self.assertNotIn("orderings", self.repository.searches[0])
+        self.assertNotIn("fetch", self.repository.searches[0])
+        self.assertNotIn("page=2", self.repository.searches[0])
+
+    def test_counts_memoized_per_query(self):
+        articles = predicates.at("document.type", "article")
+        self.assertEqual(self.form.query(articles).count(), 45)
+        self.assertEqual(self.api.form("everything").ref(self.api.get_master()).query(articles)
+                         .page(3).orderings("[document.id]").count(), 45)
+        self.assertEqual(len(self.repository.searches), 1)
+        self.assertEqual(self.form.query(predicates.at("document.id", "doc01")).count(), 1)
+        self.assertEqual(len(self.repository.searches), 2)
+
+    def test_unpublished_refs_not_memoized(self):
+        form = self.api.form("everything").ref("preview-ref")
+        self.assertEqual(form.count(), 45)
+        self.assertEqual(form.count(), 45)
+        self.assertEqual(len(self.repository.searches), 2)
+
+    def test_release_refs_not_memoized(self):
+        self.api.refs.append(prismic.api.Ref({"id": "release", "ref": "release-ref", "label": "Release"}))
+        form = self.api.form("everything").ref("release-ref")
+        self.assertEqual(form.master_refs, frozenset(["master"]))
+        self.assertEqual(form.count(), 45)
+        self.assertEqual(form.count(), 45)
+        self.assertEqual(len(self.repository.searches), 2)
+
+    def test_count_many(self):
+        counts = self.api.count_many([
+            {"q": predicates.at("document.id", "doc03")},
+            {"q": predicates.any("document.id", ["doc01", "doc02"])},
+            self.form
+        ])
+        self.assertEqual(counts, [1, 2, 45])
+
+
+class SubmitAllTestCase(StubRepositoryTestCase):
+    def setUp(self):
+        super(SubmitAllTestCase, self).setUp()
+        self.form = self.api.form("everything").ref(self.api.get_master()).page_size(10)
+
+    def test_all_pages_in_order(self):
+        documents = self.form.submit_all()
+        self.assertEqual([doc.id for doc in documents], ["doc%02d" % i for i in range(45)])
+        self.assertEqual(len(self.repository.searches), 5)
+
+    def test_failed_pages_are_retried(self):
+        self.repository.fail_next = 2
+        documents = self.form.submit_all(max_workers=1)
+        self.assertEqual(len(documents), 45)
+        self.assertEqual(len(self.repository.searches), 7)
+
+    def test_gives_up_after_retries(self):
+        self.repository.fail_next = 3
+        self.assertRaises(HTTPError, self.form.submit_all, retries=2)
+
+
+class ScanTestCase(StubRepositoryTestCase):
+    def test_whole_ref(self):
+        documents = list(self.api.scan(page_size=10))
+        self.assertEqual([doc.id for doc in documents], ["doc%02d" % i for i in range(45)])
+        self.assertEqual(len(self.repository.searches), 5)
+        self.assertIn("after=doc39", self.repository.searches[-1])
+        self.assertTrue(all("page=1&" in url or url.endswith("page=1") for url in self.repository.searches))
+
+    def test_query_and_resume(self):
+        documents = self.api.scan(predicates.any("document.id", ["doc01", "doc02", "doc03"]), page_size=1,
+                                  after="doc01")
+        self.assertEqual([doc.id for doc in documents], ["doc02", "doc03"])
+
+    def test_documents_removed_during_the_scan(self):
+        documents = self.api.scan(page_size=10)
+        seen = [next(documents).id for _ in range(10)]
+        del self.repository.documents[0:5]
+        seen.extend(doc.id for doc in documents)
+        self.assertEqual(seen, ["doc%02d" % i for i in range(45)])
+
+
+class QuerySetTestCase(StubRepositoryTestCase):
+    def setUp(self):
+        super(QuerySetTestCase, self).setUp()
+        self.articles = self.api.query_set(predicates.at("document.type", "article"))
+        del self.repository.requests[:]
+
+    def ids(self, documents):
+        return [doc.id for doc in documents]
+
+    def test_chaining_is_lazy(self):
+        query_set = self.articles.filter(predicates.any("document.id", ["doc01", "doc02", "doc30"]))\
+            .order_by("[document.id]").fetch("article.title").fetch_links("author.name")
+        self.assertEqual(self.repository.requests, [])
+        self.assertEqual(self.ids(query_set), ["doc01", "doc02", "doc30"])
+        self.assertEqual(len(self.repository.searches), 1)
+        self.assertIn("fetch=article.title", self.repository.searches[0])
+
+    def test_len(self):
+        self.assertEqual(len(self.articles), 45)
+        self.assertEqual(len(self.articles), 45)
+        self.assertEqual(len(self.repository.searches), 1)
+        self.assertIn("pageSize=1", self.repository.searches[0])
+
+    def test_slices(self):
+        self.assertEqual(self.ids(self.articles[10:20]), ["doc%02d" % i for i in range(10, 20)])
+        self.assertEqual(len(self.repository.searches), 1)
+        self.assertIn("page=2&pageSize=10", self.repository.searches[0])
+        self.assertEqual(self.ids(self.articles[12:15]), ["doc12", "doc13", "doc14"])
+        self.assertEqual(self.articles[3].id, "doc03")
+        self.assertEqual(len(self.repository.searches), 2)
+        self.assertEqual(self.articles[-1].id, "doc44")
+        self.assertEqual(self.ids(self.articles[40:]), ["doc%02d" % i for i in range(40, 45)])
+        self.assertRaises(IndexError, lambda: self.articles[45])
+
+    def test_iteration(self):
+        self.assertEqual(self.ids(self.articles), ["doc%02d" % i for i in range(45)])
+        self.assertEqual(self.articles.first().id, "doc00")
+        self.assertEqual(self.api.query_set(predicates.at("document.type", "none")).first(), None)
+
+    def test_plan_pages(self):
+        self.assertEqual(plan_pages(10, 20), (10, 2, 2))
+        self.assertEqual(plan_pages(10, 25), (25, 1, 1))
+        self.assertEqual(plan_pages(0, 5), (5, 1, 1))
+        self.assertEqual(plan_pages(95, 105), (15, 7, 7))
+        self.assertEqual(plan_pages(0, 250), (84, 1, 3))
+        self.assertEqual(plan_pages(7, 8), (1, 8, 8))
+
+
+def linking_document(doc_id, link_ids):
+    """A document linking to the given ids from a link, a group, slices and a StructuredText hyperlink"""
+    links = [{"type": "Link.document", "value": document_link(link_id)[1]} for link_id in link_ids]
+    return make_document(doc_id, data={
+        "link": tuple(document_link(link_ids[0])),
+        "group": ("Group", [{"link": links[1]}]),
+        "body": ("SliceZone", [
+            {"slice_type": "old", "value": {"type": "Group", "value": [{"link": links[2]}]}},
+            {"slice_type": "new", "non-repeat": {"link": links[3]}, "repeat": [{"link": links[4]}]}
+        ]),
+        "text": ("StructuredText", [{"type": "paragraph", "text": "Read more", "spans": [
+            {"start": 0, "end": 4, "type": "hyperlink", "data": links[5]}
+        ]}])
+    })
+
+
+class ResolveLinksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repository = StubRepository(
+            [linking_document("a", ["l1", "l2", "l3", "l4", "l5", "b"]),
+             linking_document("b", ["l1", "l6", "missing", "l4", "l5", "l2"])] +
+            [make_document("l%d" % i, data={"title": ("Text", "Title %d" % i)}) for i in range(1, 7)]
+        )
+        self.api = prismic.get(API_URL, cache=NoCache(), request_handler=self.repository)
+
+    def test_document_links(self):
+        document = self.api.get_by_id("a")
+        self.assertEqual([link.id for link in document_links(document)], ["l1", "l2", "l3", "l4", "l5", "b"])
+
+    def test_resolve_links(self):
+        response = self.api.query(predicates.any("document.id", ["a", "b"]))
+        del self.repository.requests[:]
+        linked = self.api.resolve_links(response)
+        self.assertEqual(len(self.repository.searches), 1)
+        self.assertEqual(sorted(linked), ["b", "l1", "l2", "l3", "l4", "l5", "l6"])
+        links = list(document_links(response.documents[1]))
+        self.assertEqual(links[0].document.id, "l1")
+        self.assertEqual(links[0].get_text("article.title"), "Title 1")
+        self.assertIsNone(links[2].document)
+        self.assertIs(list(document_links(response.documents[0]))[5].document, response.documents[1])
+
+    def test_nothing_to_fetch(self):
+        self.assertEqual(self.api.resolve_links([]), {})
+        self.assertEqual(len(self.repository.searches), 0)
+
+
+class PrefetchLinksTestCase(unittest.TestCase):
+    def setUp(self):
+        # root -> a, b; a -> c, root; b -> c; c -> d; d -> e
+        graph = {"root": ["a", "b"], "a": ["c", "root"], "b": ["c"], "c": ["d"], "d": ["e"], "e": []}
+        self.repository = StubRepository([
+            make_document(doc_id, data=dict(("link%d" % i, tuple(document_link(target)))
+                                            for i, target in enumerate(targets)))
+            for doc_id, targets in sorted(graph.items())
+        ])
+        self.api = prismic.get(API_URL, cache=NoCache(), request_handler=self.repository)
+
+    def test_depth(self):
+        root = self.api.get_by_id("root")
+        del self.repository.requests[:]
+        documents = self.api.prefetch_links([root], depth=2)
+        self.assertEqual(list(documents), ["root", "a", "b", "c"])
+        self.assertEqual(len(self.repository.searches), 2)
+        self.assertEqual(root.get_link("article.link0").document.id, "a")
+        self.assertEqual(documents["a"].get_link("article.link1").document, root)
+        self.assertIsNone(documents["c"].get_link("article.link0").document)
+
+    def test_cycles_and_end_of_graph(self):
+        documents = self.api.prefetch_links([self.api.get_by_id("root")], depth=10)
+        self.assertEqual(list(documents), ["root", "a", "b", "c", "d", "e"])
+        self.assertEqual(len(self.repository.searches), 5)
+
+    def test_max_documents(self):
+        documents = self.api.prefetch_links([self.api.get_by_id("root")], depth=10, max_documents=2)
+        self.assertEqual(list(documents), ["root", "a"])
+
+
+class DocumentLoaderTestCase(StubRepositoryTestCase):
+    def test_lookups_are_batched(self):
+        loader = self.api.loader()
+        by_id = [loader.load("doc%02d" % i) for i in (5, 1, 5, 30)]
+        by_uid = loader.load_by_uid("article", "uid07")
+        missing = loader.load("missing")
+        self.assertEqual([d.get().id for d in by_id], ["doc05", "doc01", "doc05", "doc30"])
+        self.assertEqual(by_uid.get().id, "doc07")
+        self.assertIsNone(missing.get())
+        self.assertEqual(len(self.repository.searches), 2)
+
+    def test_results_are_memoized(self):
+        loader = self.api.loader()
+        loader.get_by_id("doc01")
+        self.assertEqual(loader.get_by_uid("article", "uid01").id, "doc01")
+        self.assertEqual(loader.get_by_id("doc01").id, "doc01")
+        self.assertEqual(len(self.repository.searches), 1)
+
+    def test_chunks(self):
+        loader = self.api.loader(batch_size=10)
+        documents = loader.get_by_ids(["doc%02d" % i for i in range(25)])
+        self.assertEqual([doc.id for doc in documents], ["doc%02d" % i for i in range(25)])
+        self.assertEqual(len(self.repository.searches), 3)
+
+    def test_errors(self):
+        loader = self.api.loader()
+        deferred = loader.load("doc01")
+        self.repository.fail_next = 1
+        self.assertRaises(HTTPError, deferred.get)
+
+
+if __name__ == '__main__':
+    unittest.main()